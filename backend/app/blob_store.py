@@ -0,0 +1,162 @@
+# Save this as backend/app/blob_store.py
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+# --- 1. Settings ---
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")   # "local" or "s3"
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "blobs")
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")                 # For MinIO / R2 / other S3-compatible stores
+S3_PRESIGN_SECONDS = int(os.getenv("S3_PRESIGN_SECONDS", 3600))
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+# Magic bytes -> content type, for serving blobs whose name is only a hash
+_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+]
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_content_hash(value: Optional[str]) -> bool:
+    return bool(value) and bool(_DIGEST.match(value))
+
+
+def sniff_content_type(head: bytes) -> str:
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+
+# --- 2. Local Filesystem Backend ---
+class LocalBlobStore:
+    """
+    Content-addressed blobs on disk at <root>/<ab>/<cd>/<sha256>. Identical
+    bytes map to the same file, so duplicate images are written once.
+    """
+
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        self.root = Path(root)
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    async def put(self, data: bytes, content_type: Optional[str] = None) -> str:
+        digest = content_hash(data)
+        # File I/O runs in a thread so the event loop never blocks on disk
+        await asyncio.to_thread(self._write, digest, data)
+        return digest
+
+    def _write(self, digest: str, data: bytes):
+        target = self.path(digest)
+        if target.exists():
+            return  # Dedup: same hash, same bytes
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename, so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    async def get(self, digest: str) -> Optional[bytes]:
+        try:
+            return await asyncio.to_thread(self.path(digest).read_bytes)
+        except FileNotFoundError:
+            return None
+
+    async def stat(self, digest: str) -> Optional[tuple]:
+        """
+        Returns (os.stat_result, content type) or None if the blob doesn't exist.
+        """
+        return await asyncio.to_thread(self._stat, digest)
+
+    def _stat(self, digest: str) -> Optional[tuple]:
+        target = self.path(digest)
+        try:
+            with open(target, "rb") as f:
+                head = f.read(16)
+                return os.fstat(f.fileno()), sniff_content_type(head)
+        except FileNotFoundError:
+            return None
+
+
+# --- 3. S3-Compatible Backend (Optional) ---
+class S3BlobStore:
+    """
+    Content-addressed blobs in an S3-compatible bucket, keyed by hash.
+    Reads are served by redirecting to a short-lived presigned URL.
+    """
+
+    def __init__(self, bucket: str = S3_BUCKET, endpoint_url: Optional[str] = S3_ENDPOINT_URL):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("BLOB_STORE_BACKEND=s3 requires boto3 (pip install boto3).")
+        if not bucket:
+            raise ValueError("S3_BUCKET not found in environment variables.")
+        self.bucket = bucket
+        self._client = boto3.client("s3", endpoint_url=endpoint_url)
+        self._client_error = ClientError
+
+    async def put(self, data: bytes, content_type: Optional[str] = None) -> str:
+        digest = content_hash(data)
+        await asyncio.to_thread(self._write, digest, data, content_type or sniff_content_type(data[:16]))
+        return digest
+
+    def _write(self, digest: str, data: bytes, content_type: str):
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=digest)
+            return  # Dedup: already stored
+        except self._client_error:
+            pass
+        self._client.put_object(
+            Bucket=self.bucket,
+            Key=digest,
+            Body=data,
+            ContentType=content_type,
+            CacheControl="public, max-age=31536000, immutable",
+        )
+
+    async def get(self, digest: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, digest)
+
+    def _read(self, digest: str) -> Optional[bytes]:
+        try:
+            return self._client.get_object(Bucket=self.bucket, Key=digest)["Body"].read()
+        except self._client_error:
+            return None
+
+    async def presigned_url(self, digest: str) -> str:
+        return await asyncio.to_thread(
+            self._client.generate_presigned_url,
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": digest},
+            ExpiresIn=S3_PRESIGN_SECONDS,
+        )
+
+
+def create_blob_store():
+    if BLOB_STORE_BACKEND == "s3":
+        return S3BlobStore()
+    return LocalBlobStore()
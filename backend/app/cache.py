@@ -0,0 +1,221 @@
+# Save this as backend/app/cache.py
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# --- 1. Settings ---
+CACHE_TTL_SECONDS = 60 * 60 * 24
+# Copies kept past the normal expiry, served only when the AI service is unavailable
+STALE_TTL_SECONDS = int(os.getenv("STALE_CACHE_TTL_SECONDS", 60 * 60 * 24 * 7))
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", 10000))
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+# Workers publish every overwrite/delete here so peers drop their local copy
+INVALIDATION_CHANNEL = "design-cache:invalidate"
+
+
+# --- 2. Local Tier (In-Process LRU + TTL) ---
+class LocalCache:
+    """
+    Bounded in-process LRU. Entries carry their own expiry so they never
+    outlive the matching Redis key.
+    """
+
+    def __init__(self, max_entries: int = LOCAL_CACHE_MAX_ENTRIES, max_bytes: int = LOCAL_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def set(self, key: str, value: dict, ttl_seconds: float):
+        if ttl_seconds <= 0:
+            return
+        size = len(key) + sum(len(k) + len(str(v)) for k, v in value.items())
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl_seconds, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def delete(self, key: str):
+        self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+
+# --- 3. Two-Tier Cache (Local -> Redis) ---
+class DesignCache:
+    """
+    Prompt-result cache: in-process LRU in front of Redis. Reads fall through
+    local -> Redis; writes go to both. Overwrites and deletes are broadcast over
+    Redis pub/sub so every worker's local tier stays coherent.
+    """
+
+    def __init__(self, redis_client, local: Optional[LocalCache] = None):
+        self.redis = redis_client
+        # Not `local or ...`: an empty LocalCache is falsy (it has __len__)
+        self.local = local if local is not None else LocalCache()
+        self.stats = {"redis_hits": 0, "redis_misses": 0, "stale_hits": 0}
+        self._listener: Optional[asyncio.Task] = None
+        self._pubsub = None
+        # Tags our own broadcasts so we don't evict what we just wrote
+        self._origin = uuid.uuid4().hex
+
+    async def get(self, key: str) -> Optional[dict]:
+        design = self.local.get(key)
+        if design is not None:
+            return design
+        if not self.redis:
+            return None
+
+        # Fetch the value and its remaining TTL together so the local copy expires with Redis
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(key)
+            pipe.pttl(key)
+            cached_data, ttl_ms = await pipe.execute()
+
+        if not cached_data or 'image_hash' not in cached_data:
+            self.stats["redis_misses"] += 1
+            return None
+        self.stats["redis_hits"] += 1
+        if ttl_ms and ttl_ms > 0:
+            self.local.set(key, cached_data, ttl_ms / 1000)
+        return cached_data
+
+    async def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        """
+        Batch form of get(): local tier first, then every remaining key in a
+        single Redis pipeline. Returns {key: design} for the keys that hit.
+        """
+        found = {}
+        remote = []
+        for key in dict.fromkeys(keys):
+            design = self.local.get(key)
+            if design is not None:
+                found[key] = design
+            else:
+                remote.append(key)
+        if not remote or not self.redis:
+            return found
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in remote:
+                pipe.hgetall(key)
+                pipe.pttl(key)
+            replies = await pipe.execute()
+
+        for key, cached_data, ttl_ms in zip(remote, replies[::2], replies[1::2]):
+            if not cached_data or 'image_hash' not in cached_data:
+                self.stats["redis_misses"] += 1
+                continue
+            self.stats["redis_hits"] += 1
+            if ttl_ms and ttl_ms > 0:
+                self.local.set(key, cached_data, ttl_ms / 1000)
+            found[key] = cached_data
+        return found
+
+    async def set(self, key: str, design: dict, ttl_seconds: int = CACHE_TTL_SECONDS):
+        if self.redis:
+            # hset + expire + stale copy + invalidation broadcast go out in a single round trip
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=design)
+                pipe.expire(key, ttl_seconds)
+                pipe.hset(f"stale:{key}", mapping=design)
+                pipe.expire(f"stale:{key}", STALE_TTL_SECONDS)
+                pipe.publish(INVALIDATION_CHANNEL, f"{self._origin}|{key}")
+                await pipe.execute()
+        self.local.set(key, design, ttl_seconds)
+
+    async def get_stale(self, key: str) -> Optional[dict]:
+        """
+        Fallback lookup that ignores the normal TTL (up to STALE_TTL_SECONDS).
+        """
+        design = self.local.get(key)
+        if design is not None or not self.redis:
+            return design
+        cached_data = await self.redis.hgetall(f"stale:{key}")
+        if not cached_data or 'image_hash' not in cached_data:
+            return None
+        self.stats["stale_hits"] += 1
+        return cached_data
+
+    async def invalidate(self, key: str):
+        self.local.delete(key)
+        if self.redis:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key, f"stale:{key}")
+                pipe.publish(INVALIDATION_CHANNEL, f"{self._origin}|{key}")
+                await pipe.execute()
+
+    # --- Cross-Worker Invalidation ---
+    async def start(self):
+        if not self.redis or self._listener is not None:
+            return
+        self._pubsub = self.redis.pubsub()
+        await self._pubsub.subscribe(INVALIDATION_CHANNEL)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(INVALIDATION_CHANNEL)
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+    async def _listen(self):
+        try:
+            async for message in self._pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                origin, _, key = message["data"].partition("|")
+                if origin != self._origin:
+                    self.local.delete(key)
+        except Exception as e:
+            # Without the channel we can't stay coherent - stop serving local copies
+            print(f"Cache Invalidation Error: listener stopped, local tier disabled: {e}")
+            self.local = LocalCache(max_entries=0, max_bytes=0)
+
+    def snapshot(self) -> dict:
+        return {
+            "local": {**self.local.stats, "entries": len(self.local), "bytes": self.local.size_bytes},
+            "redis": dict(self.stats),
+        }
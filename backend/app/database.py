@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 from sqlalchemy import Column, Integer, String, Text, DateTime
 from sqlalchemy.orm import declarative_base # ORM base remains the same
 from datetime import datetime
+from uuid import uuid4
 from dotenv import load_dotenv
 import os
 
@@ -17,8 +18,55 @@ if not DATABASE_URL:
 # CHANGE 1: Use 'postgresql+asyncpg' driver instead of 'postgresql'
 ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
 
+# Optional read replica for read-only endpoints like /api/history; falls back to the primary
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+ASYNC_REPLICA_URL = DATABASE_REPLICA_URL.replace("postgresql://", "postgresql+asyncpg://") if DATABASE_REPLICA_URL else None
+
+# Pool sizing is per uvicorn worker: total connections = workers * (pool_size + max_overflow)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", 10))
+DB_POOL_RECYCLE_S = int(os.getenv("DB_POOL_RECYCLE_S", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 500))
+# Set when DATABASE_URL points at PgBouncer in transaction/statement pooling mode
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+
+def engine_options(url: str) -> dict:
+    """
+    Pool and driver settings for create_async_engine. Prepared statements are
+    cached per connection; behind PgBouncer a client connection can land on a
+    different server connection each transaction, so both caches are turned
+    off and statement names are made unique to avoid collisions.
+    """
+    options = {"echo": False, "pool_pre_ping": DB_POOL_PRE_PING}
+    if url.startswith("sqlite"):
+        return options  # SQLite (local dev) has no server-side pool or prepared statements
+
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT_S,
+        pool_recycle=DB_POOL_RECYCLE_S,
+    )
+    if url.startswith("postgresql+asyncpg"):
+        if DB_PGBOUNCER:
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        else:
+            options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
 # Create the ASYNC engine
-engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
+engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+replica_engine = (
+    create_async_engine(ASYNC_REPLICA_URL, **engine_options(ASYNC_REPLICA_URL)) if ASYNC_REPLICA_URL else engine
+)
 
 # Create an ASYNC session maker
 AsyncSessionLocal = async_sessionmaker(
@@ -26,6 +74,7 @@ AsyncSessionLocal = async_sessionmaker(
     class_=AsyncSession, 
     expire_on_commit=False # Ensures objects can be accessed outside the session block
 )
+ReplicaSessionLocal = async_sessionmaker(bind=replica_engine, class_=AsyncSession, expire_on_commit=False)
 
 # Base class for model definitions
 Base = declarative_base()
@@ -47,4 +96,11 @@ class Conversation(Base):
 # Function to get an asynchronous database session (Dependency for FastAPI)
 async def get_db_async(): # <-- FUNCTION IS NOW ASYNCHRONOUS
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+# Read-only sessions (replica when DATABASE_REPLICA_URL is set). Replicas lag
+# slightly, so only use this for endpoints that tolerate slightly stale reads.
+async def get_db_replica():
+    async with ReplicaSessionLocal() as session:
+        yield session
@@ -0,0 +1,296 @@
+# Save this as backend/app/derivatives.py
+
+import asyncio
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+from app.singleflight import SingleFlight
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# --- 1. Settings ---
+DERIVATIVE_DIR = os.getenv("DERIVATIVE_DIR", "derivatives")
+DERIVATIVE_CACHE_MAX_BYTES = int(os.getenv("DERIVATIVE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+# Every uvicorn worker starts its own encoder pool, so by default they split the cores between
+# them. WEB_CONCURRENCY is what uvicorn/gunicorn read as the worker count - keep it in sync.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))
+DERIVATIVE_WORKERS = int(os.getenv("DERIVATIVE_WORKERS", max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)))
+# How often the janitor sweeps the shared directory back under DERIVATIVE_CACHE_MAX_BYTES
+JANITOR_INTERVAL_S = float(os.getenv("DERIVATIVE_JANITOR_INTERVAL_S", 30))
+EVICT_LOW_WATERMARK = 0.9       # Sweep down to 90% of the cap so every pass isn't an eviction
+TOUCH_INTERVAL_S = 60           # Bump a served file's mtime at most once a minute
+
+# Precomputed at write time; any other width is rendered on demand
+VARIANTS = {"thumb": 160, "preview": 512}
+MIN_WIDTH, MAX_WIDTH = 16, 2048
+QUALITY = {"webp": 80, "avif": 55, "jpeg": 82}
+CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif", "jpeg": "image/jpeg"}
+# Format used for the URLs handed to the UI (supported by every current browser)
+DEFAULT_FORMAT = "webp"
+
+
+def supported_formats() -> list:
+    from PIL import features
+    formats = ["webp", "jpeg"]
+    if features.check("avif"):
+        formats.append("avif")
+    return formats
+
+
+# --- 2. Encoder (Runs in Worker Processes) ---
+# Top-level functions so they can be pickled into the process pool; the event loop never touches Pillow.
+def _resize(image, width: int):
+    # Never upscales
+    from PIL import Image
+
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _encode(image, fmt: str) -> bytes:
+    if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    out = io.BytesIO()
+    image.save(out, format=fmt.upper(), quality=QUALITY[fmt])
+    return out.getvalue()
+
+
+def render(data: bytes, width: int, fmt: str) -> bytes:
+    """
+    Resizes to the given width and encodes one derivative (on-demand sizes).
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        return _encode(_resize(image, width), fmt)
+
+
+def render_all(data: bytes, variants: list) -> dict:
+    """
+    Every (width, fmt) in `variants` from a single decode: one resize per
+    width, one encode per format. Returns {(width, fmt): bytes}.
+    """
+    from PIL import Image
+
+    results = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        for width in sorted({width for width, _ in variants}, reverse=True):
+            resized = _resize(image, width)
+            for fmt in [fmt for w, fmt in variants if w == width]:
+                results[(width, fmt)] = _encode(resized, fmt)
+    return results
+
+
+# --- 3. Derivative Store (Bounded On-Disk LRU) ---
+class DerivativeStore:
+    """
+    Resized/re-encoded copies of blobs at <root>/<hash>/<width>.<fmt>. The
+    directory is shared by every uvicorn worker, so the disk (not any one
+    worker's memory) is the source of truth: hits are checked on disk, and a
+    single janitor process keeps the total under max_bytes by deleting the
+    least recently served files (mtime is bumped on use).
+    """
+
+    def __init__(self, blob_store, root: str = DERIVATIVE_DIR, max_bytes: int = DERIVATIVE_CACHE_MAX_BYTES,
+                 workers: int = DERIVATIVE_WORKERS, janitor_interval: float = JANITOR_INTERVAL_S):
+        self.blob_store = blob_store
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.janitor_interval = janitor_interval
+        self.formats = supported_formats()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._flight = SingleFlight()  # One encode per derivative, however many requests ask
+        self._pending: set = set()
+        self._precomputing: dict = {}  # image_hash -> task rendering its standard variants
+        self._janitor: Optional[asyncio.Task] = None
+        self._janitor_lock = None  # Open lock file while this worker is the janitor
+        self.stats = {
+            "hits": 0, "encodes": 0, "encode_ms": 0.0, "bytes_written": 0,
+            "pool_calls": 0, "pool_bytes_sent": 0,   # Source bytes pickled to the encoder processes
+            "evictions": 0, "disk_bytes": 0, "is_janitor": 0,
+        }
+
+    async def start(self):
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._janitor = asyncio.create_task(self._run_janitor())
+
+    async def stop(self):
+        for task in list(self._pending):
+            task.cancel()
+        if self._janitor is not None:
+            self._janitor.cancel()
+            self._janitor = None
+        if self._janitor_lock is not None:
+            self._janitor_lock.close()  # Releases the flock so another worker takes over
+            self._janitor_lock = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def path(self, image_hash: str, width: int, fmt: str) -> Path:
+        return self.root / image_hash / f"{width}.{fmt}"
+
+    def url(self, image_hash: str, variant: str, fmt: str = DEFAULT_FORMAT) -> str:
+        return f"/api/images/{image_hash}/{VARIANTS[variant]}.{fmt}"
+
+    def precompute(self, image_hash: str, data: bytes):
+        """
+        Schedules every standard variant in the background; returns immediately.
+        The source goes to the pool once and is decoded once for all of them.
+        """
+        if image_hash in self._precomputing:
+            return
+        task = asyncio.create_task(self._render_standard(image_hash, data))
+        self._precomputing[image_hash] = task
+        self._pending.add(task)
+        task.add_done_callback(partial(self._finished, image_hash))
+
+    def _finished(self, image_hash: str, task: asyncio.Task):
+        self._pending.discard(task)
+        self._precomputing.pop(image_hash, None)
+        if not task.cancelled() and task.exception() is not None:
+            # Not fatal: the variant is rendered on demand when first requested
+            print(f"Derivative Error: precompute failed: {task.exception()}")
+
+    def is_standard(self, width: int, fmt: str) -> bool:
+        return width in VARIANTS.values() and fmt in self.formats
+
+    async def get(self, image_hash: str, width: int, fmt: str) -> Optional[Path]:
+        """
+        Returns the path of the derivative, rendering it first if needed.
+        None if the source image doesn't exist.
+        """
+        path = self.path(image_hash, width, fmt)
+        # Another worker (or the janitor) may have written or deleted it - ask the disk
+        if await asyncio.to_thread(self._touch, path):
+            self.stats["hits"] += 1
+            return path
+        precomputing = self._precomputing.get(image_hash)
+        if precomputing is not None and self.is_standard(width, fmt):
+            # Already being rendered with its siblings; wait for that instead of encoding twice
+            try:
+                await asyncio.shield(precomputing)
+            except Exception:
+                pass  # Fall back to rendering on demand below
+            if await asyncio.to_thread(self._touch, path):
+                self.stats["hits"] += 1
+                return path
+        return await self._flight.do(str(path), lambda: self._render(image_hash, width, fmt, path))
+
+    @staticmethod
+    def _touch(path: Path) -> bool:
+        # Marks the file as recently served for the janitor; False if it doesn't exist
+        try:
+            if time.time() - path.stat().st_mtime > TOUCH_INTERVAL_S:
+                os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def _render(self, image_hash: str, width: int, fmt: str, path: Path):
+        data = await self.blob_store.get(image_hash)
+        if data is None:
+            return None
+        encoded = await self._encode_in_pool(render, data, width, fmt)
+        self.stats["encodes"] += 1
+        await asyncio.to_thread(self._write, path, encoded)
+        self.stats["bytes_written"] += len(encoded)
+        return path
+
+    async def _render_standard(self, image_hash: str, data: bytes):
+        wanted = [(width, fmt) for width in VARIANTS.values() for fmt in self.formats]
+        missing = await asyncio.to_thread(
+            lambda: [(width, fmt) for width, fmt in wanted if not self.path(image_hash, width, fmt).exists()]
+        )
+        if not missing:
+            return
+        encoded = await self._encode_in_pool(render_all, data, missing)
+        self.stats["encodes"] += len(encoded)
+        for (width, fmt), derivative in encoded.items():
+            await asyncio.to_thread(self._write, self.path(image_hash, width, fmt), derivative)
+            self.stats["bytes_written"] += len(derivative)
+
+    async def _encode_in_pool(self, fn, data: bytes, *args):
+        started = time.perf_counter()
+        self.stats["pool_calls"] += 1
+        self.stats["pool_bytes_sent"] += len(data)
+        result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, data, *args)
+        self.stats["encode_ms"] += (time.perf_counter() - started) * 1000
+        return result
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Temp file + rename so readers never see a partial file; the temp file never outlives a failure
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    # --- Janitor (One Worker at a Time) ---
+    async def _run_janitor(self):
+        while True:
+            try:
+                if self._janitor_lock is None:
+                    self._janitor_lock = await asyncio.to_thread(self._try_become_janitor)
+                    self.stats["is_janitor"] = int(self._janitor_lock is not None)
+                if self._janitor_lock is not None:
+                    await asyncio.to_thread(self._evict)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Derivative Error: janitor pass failed: {e}")
+            await asyncio.sleep(self.janitor_interval)
+
+    def _try_become_janitor(self):
+        """
+        Non-blocking exclusive flock on <root>/.janitor.lock. The OS drops it
+        when the holder exits, so a surviving worker takes over on its next try.
+        """
+        if fcntl is None:
+            return open(os.devnull)  # No flock (Windows): every worker sweeps, deletes are idempotent
+        self.root.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.root / ".janitor.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _evict(self):
+        # Scan the shared directory; delete least recently served files down to the low watermark
+        files = []
+        total = 0
+        for entry in self.root.glob("*/*"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_LOW_WATERMARK
+            for _, size, entry in sorted(files):
+                if total <= target:
+                    break
+                entry.unlink(missing_ok=True)
+                total -= size
+                self.stats["evictions"] += 1
+        self.stats["disk_bytes"] = total
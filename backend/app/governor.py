@@ -0,0 +1,282 @@
+# Save this as backend/app/governor.py
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+# --- 1. Settings ---
+GLOBAL_RATE_PER_S = float(os.getenv("GOVERNOR_GLOBAL_RATE", 5))        # Upstream calls/s per worker
+GLOBAL_BURST = int(os.getenv("GOVERNOR_GLOBAL_BURST", 10))
+CLIENT_RATE_PER_S = float(os.getenv("GOVERNOR_CLIENT_RATE", 0.2))      # Upstream calls/s per client
+CLIENT_BURST = int(os.getenv("GOVERNOR_CLIENT_BURST", 5))
+MAX_TRACKED_CLIENTS = 10000
+# Behind a load balancer every request comes from the balancer's address. Set this to the header
+# it forwards the caller in (e.g. X-Forwarded-For, X-Real-IP, CF-Connecting-IP) - only if the
+# balancer overwrites/appends it, since clients can send any header they like.
+CLIENT_ID_HEADER = os.getenv("CLIENT_ID_HEADER")
+# For X-Forwarded-For style lists: how many trusted proxies append to it (use the entry they added)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 1))
+
+CONCURRENCY_INITIAL = int(os.getenv("GOVERNOR_CONCURRENCY_INITIAL", 8))
+CONCURRENCY_MIN = int(os.getenv("GOVERNOR_CONCURRENCY_MIN", 1))
+CONCURRENCY_MAX = int(os.getenv("GOVERNOR_CONCURRENCY_MAX", 64))
+LATENCY_TARGET_S = float(os.getenv("GOVERNOR_LATENCY_TARGET_S", 15))    # Slower than this counts as congestion
+MAX_WAIT_S = float(os.getenv("GOVERNOR_MAX_WAIT_S", 5))                 # Longest a call queues for a token/slot
+UPSTREAM_TIMEOUT_S = float(os.getenv("GEMINI_TIMEOUT_S", 60))
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("GOVERNOR_BREAKER_FAILURES", 5))
+BREAKER_OPEN_S = float(os.getenv("GOVERNOR_BREAKER_OPEN_S", 30))
+
+
+# --- 2. Errors ---
+class UpstreamUnavailable(Exception):
+    """
+    The governor refused or gave up on an upstream call. Carries the HTTP
+    status the API should answer with when no stale design can be served.
+    """
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ClientRateLimited(UpstreamUnavailable):
+    status_code = 429
+
+
+class UpstreamTimeout(UpstreamUnavailable):
+    status_code = 504
+
+
+# --- 3. Token Bucket ---
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, n: int = 1) -> bool:
+        # All-or-nothing: a multi-token request either gets every token or takes none
+        self._refill()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def wait_time(self, n: int = 1) -> float:
+        self._refill()
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    async def acquire(self, max_wait: float) -> bool:
+        deadline = time.monotonic() + max_wait
+        while not self.try_acquire():
+            delay = self.wait_time()
+            if time.monotonic() + delay > deadline:
+                return False
+            await asyncio.sleep(delay)
+        return True
+
+
+# --- 4. AIMD Concurrency Limit ---
+class AIMDLimiter:
+    """
+    Adaptive cap on in-flight upstream calls: +1 per limit's worth of fast
+    successes (additive increase), halved on a 429/timeout or a call slower
+    than LATENCY_TARGET_S (multiplicative decrease). Only calls started after
+    the last decrease can trigger another one, so a single congestion episode
+    (every in-flight call comes back slow) halves the limit once, not N times.
+    """
+
+    def __init__(self, initial: int = CONCURRENCY_INITIAL, minimum: int = CONCURRENCY_MIN,
+                 maximum: int = CONCURRENCY_MAX, latency_target: float = LATENCY_TARGET_S):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self, max_wait: float) -> bool:
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self.in_flight < int(self.limit)),
+                    timeout=max_wait
+                )
+            except asyncio.TimeoutError:
+                return False
+            self.in_flight += 1
+            return True
+
+    async def release(self, latency: Optional[float], congested: bool, started: float):
+        async with self._changed:
+            self.in_flight -= 1
+            if congested or (latency is not None and latency > self.latency_target):
+                if started >= self._last_decrease:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = time.monotonic()
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._changed.notify_all()
+
+
+# --- 5. Circuit Breaker ---
+class CircuitBreaker:
+    """
+    closed -> open after BREAKER_FAILURE_THRESHOLD consecutive failures;
+    open -> half-open after BREAKER_OPEN_S, letting a single probe through;
+    the probe's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, open_seconds: float = BREAKER_OPEN_S):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        return max(1.0, self.open_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def record_neutral(self):
+        # A client-side error (bad prompt etc.) says nothing about upstream health
+        self._probe_in_flight = False
+
+
+# --- 6. Governor ---
+class UpstreamGovernor:
+    """
+    Wraps every Gemini call: circuit breaker -> global token bucket -> AIMD
+    concurrency slot -> call with timeout. Per-client quotas are checked
+    separately (check_client), only by the caller that becomes the
+    single-flight leader, so coalesced followers are never charged.
+    """
+
+    def __init__(self, is_throttle: Callable[[Exception], bool], is_server_error: Callable[[Exception], bool]):
+        self.is_throttle = is_throttle
+        self.is_server_error = is_server_error
+        self.global_bucket = TokenBucket(GLOBAL_RATE_PER_S, GLOBAL_BURST)
+        self.client_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.limiter = AIMDLimiter()
+        self.breaker = CircuitBreaker()
+        self.stats = {
+            "calls": 0, "successes": 0, "failures": 0, "throttled": 0, "timeouts": 0,
+            "rejected_breaker": 0, "rejected_overload": 0, "rejected_client": 0,
+        }
+
+    def check_client(self, client_id: str, cost: int = 1):
+        """
+        Charges `cost` upstream calls to the client's quota, all or nothing.
+        A cost above CLIENT_BURST can never be admitted; callers should
+        reject such requests up front (see client_burst).
+        """
+        bucket = self.client_buckets.get(client_id)
+        if bucket is None:
+            bucket = self.client_buckets[client_id] = TokenBucket(CLIENT_RATE_PER_S, CLIENT_BURST)
+            if len(self.client_buckets) > MAX_TRACKED_CLIENTS:
+                self.client_buckets.popitem(last=False)
+        self.client_buckets.move_to_end(client_id)
+        if not bucket.try_acquire(cost):
+            self.stats["rejected_client"] += 1
+            raise ClientRateLimited("Generation quota exceeded for this client.", retry_after=bucket.wait_time(cost))
+
+    @staticmethod
+    def client_burst() -> int:
+        # Most upstream calls one client can be charged for at once
+        return CLIENT_BURST
+
+    async def call(self, fn: Callable[[], Awaitable]):
+        if not self.breaker.allow():
+            self.stats["rejected_breaker"] += 1
+            raise UpstreamUnavailable("AI service is temporarily unavailable.", retry_after=self.breaker.retry_after())
+
+        if not await self.global_bucket.acquire(MAX_WAIT_S):
+            self.breaker.record_neutral()
+            self.stats["rejected_overload"] += 1
+            raise UpstreamUnavailable("AI service is at capacity.", retry_after=self.global_bucket.wait_time())
+        if not await self.limiter.acquire(MAX_WAIT_S):
+            self.breaker.record_neutral()
+            self.stats["rejected_overload"] += 1
+            raise UpstreamUnavailable("AI service is at capacity.", retry_after=MAX_WAIT_S)
+
+        self.stats["calls"] += 1
+        started = time.monotonic()
+        latency, congested = None, False
+        try:
+            result = await asyncio.wait_for(fn(), timeout=UPSTREAM_TIMEOUT_S)
+            latency = time.monotonic() - started
+            self.breaker.record_success()
+            self.stats["successes"] += 1
+            return result
+        except asyncio.TimeoutError:
+            congested = True
+            self.breaker.record_failure()
+            self.stats["timeouts"] += 1
+            raise UpstreamTimeout("AI service timed out.")
+        except Exception as e:
+            if self.is_throttle(e):
+                congested = True
+                self.stats["throttled"] += 1
+                self.breaker.record_failure()
+            elif self.is_server_error(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_neutral()
+            self.stats["failures"] += 1
+            raise
+        finally:
+            await self.limiter.release(latency, congested, started)
+
+    @staticmethod
+    def client_key(headers, peer_host: Optional[str]) -> Optional[str]:
+        """
+        Quota key for a request: the configured forwarded header when present,
+        otherwise the TCP peer address.
+        """
+        if CLIENT_ID_HEADER:
+            forwarded = [part.strip() for part in headers.get(CLIENT_ID_HEADER, "").split(",") if part.strip()]
+            if forwarded:
+                # The rightmost entries were added by our own proxies; anything left of them is client-supplied
+                return forwarded[-min(TRUSTED_PROXY_HOPS, len(forwarded))]
+        return peer_host
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "breaker_state": self.breaker.state,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+        }
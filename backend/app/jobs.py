@@ -0,0 +1,359 @@
+# Save this as backend/app/jobs.py
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+# --- 1. Settings ---
+JOB_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", 8))   # Generations in flight per uvicorn worker
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 4))
+JOB_RETRY_BASE_DELAY_S = float(os.getenv("JOB_RETRY_BASE_DELAY_S", 1.0))
+JOB_TTL_SECONDS = 60 * 60 * 24
+# A running job's lease is renewed every JOB_LEASE_S / 3; if its worker dies, the job is requeued once it lapses
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", 30))
+JOB_POLL_INTERVAL_S = 0.25
+
+QUEUED, RUNNING, RETRYING, DONE, FAILED = "queued", "running", "retrying", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+
+def new_job(prompt: str, priority: int, dedup_key: str) -> dict:
+    return {
+        "id": uuid.uuid4().hex,
+        "prompt": prompt,
+        "priority": priority,
+        "dedup_key": dedup_key,
+        "status": QUEUED,
+        "attempts": 0,
+        "created_at": time.time(),
+        "result": None,
+        "error": None,
+    }
+
+
+# --- 2. Retry Helper ---
+async def retry_with_backoff(
+    fn: Callable[[], Awaitable],
+    retry_on: tuple,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+    base_delay: float = JOB_RETRY_BASE_DELAY_S,
+    on_retry: Optional[Callable[[int, Exception, float], Awaitable]] = None,
+):
+    """
+    Runs fn, retrying on the given exceptions with exponential backoff
+    (base_delay * 2^n, with jitter). Re-raises after max_attempts.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return await fn()
+        except retry_on as e:
+            if attempt == max_attempts:
+                raise
+            delay = base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            if on_retry:
+                await on_retry(attempt, e, delay)
+            await asyncio.sleep(delay)
+
+
+# --- 3. Queue Backends ---
+# Moves the next job id from the queue to the processing set, leased until ARGV[1]
+_CLAIM_SCRIPT = """
+local popped = redis.call('zpopmin', KEYS[1])
+if #popped == 0 then
+    return false
+end
+redis.call('zadd', KEYS[2], ARGV[1], popped[1])
+return popped[1]
+"""
+
+
+class RedisJobQueue:
+    """
+    Shared across uvicorn workers. Pending job ids live in a sorted set
+    (higher priority first, then FIFO); each job is a hash with a 24h TTL.
+    Claimed ids move atomically to a processing set scored by lease expiry;
+    the worker renews the lease while it runs, and expired leases (a crashed
+    worker) are put back on the queue. A per-prompt dedup key points at the
+    pending job so identical submissions join it instead of queuing again.
+    """
+
+    QUEUE_KEY = "jobs:queue"
+    PROCESSING_KEY = "jobs:processing"
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    @staticmethod
+    def _score(priority: int) -> float:
+        # Priority dominates; enqueue time (ms) breaks ties
+        return -priority * 1e13 + time.time() * 1000
+
+    async def enqueue(self, prompt: str, priority: int, dedup_key: str,
+                      admit: Optional[Callable[[], None]] = None) -> tuple:
+        """
+        Returns (job, deduplicated). admit runs only when a new job would be
+        created (e.g. to charge a quota); if it raises, nothing is queued.
+        """
+        job = new_job(prompt, priority, dedup_key)
+        claimed = await self.redis.set(f"jobs:dedup:{dedup_key}", job["id"], nx=True, ex=JOB_TTL_SECONDS)
+        if not claimed:
+            existing = await self.get(await self.redis.get(f"jobs:dedup:{dedup_key}") or "")
+            if existing and existing["status"] not in FINISHED and await self._is_live(existing["id"]):
+                return existing, True
+        if admit is not None:
+            try:
+                admit()
+            except Exception:
+                if claimed:
+                    await self.redis.delete(f"jobs:dedup:{dedup_key}")
+                raise
+        if not claimed:
+            await self.redis.set(f"jobs:dedup:{dedup_key}", job["id"], ex=JOB_TTL_SECONDS)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(f"job:{job['id']}", mapping={"data": json.dumps(job)})
+            pipe.expire(f"job:{job['id']}", JOB_TTL_SECONDS)
+            pipe.zadd(self.QUEUE_KEY, {job["id"]: self._score(priority)})
+            await pipe.execute()
+        return job, False
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        if not job_id:
+            return None
+        data = await self.redis.hget(f"job:{job_id}", "data")
+        return json.loads(data) if data else None
+
+    async def update(self, job: dict):
+        await self.redis.hset(f"job:{job['id']}", mapping={"data": json.dumps(job)})
+
+    async def _is_live(self, job_id: str) -> bool:
+        # Queued, or claimed by a worker whose lease hasn't lapsed
+        if await self.redis.zscore(self.QUEUE_KEY, job_id) is not None:
+            return True
+        lease = await self.redis.zscore(self.PROCESSING_KEY, job_id)
+        return lease is not None and lease > time.time()
+
+    async def next_job(self, timeout: float) -> Optional[str]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job_id = await self.redis.eval(
+                _CLAIM_SCRIPT, 2, self.QUEUE_KEY, self.PROCESSING_KEY, time.time() + JOB_LEASE_S
+            )
+            if job_id or time.monotonic() >= deadline:
+                return job_id or None
+            await asyncio.sleep(JOB_POLL_INTERVAL_S)
+
+    async def heartbeat(self, job_id: str):
+        await self.redis.zadd(self.PROCESSING_KEY, {job_id: time.time() + JOB_LEASE_S}, xx=True)
+
+    async def requeue(self, job: dict):
+        job["status"] = QUEUED
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.PROCESSING_KEY, job["id"])
+            pipe.hset(f"job:{job['id']}", mapping={"data": json.dumps(job)})
+            pipe.zadd(self.QUEUE_KEY, {job["id"]: self._score(job["priority"])})
+            await pipe.execute()
+
+    async def requeue_expired(self) -> int:
+        """
+        Puts jobs whose lease lapsed (their worker died) back on the queue.
+        A job that keeps losing its worker is failed after JOB_MAX_ATTEMPTS.
+        """
+        recovered = 0
+        for job_id in await self.redis.zrangebyscore(self.PROCESSING_KEY, "-inf", time.time()):
+            # ZREM decides which worker recovers it when several reap at once
+            if not await self.redis.zrem(self.PROCESSING_KEY, job_id):
+                continue
+            job = await self.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                continue
+            job["recoveries"] = job.get("recoveries", 0) + 1
+            if job["recoveries"] >= JOB_MAX_ATTEMPTS:
+                job["status"] = FAILED
+                job["error"] = "Job lost its worker too many times."
+                await self.finish(job)
+            else:
+                await self.requeue(job)
+            recovered += 1
+        return recovered
+
+    async def finish(self, job: dict):
+        await self.update(job)
+        await self.redis.zrem(self.PROCESSING_KEY, job["id"])
+        # Only clear the dedup pointer if it still points at this job
+        dedup_key = f"jobs:dedup:{job['dedup_key']}"
+        if await self.redis.get(dedup_key) == job["id"]:
+            await self.redis.delete(dedup_key)
+
+
+class LocalJobQueue:
+    """
+    In-process stand-in with the same interface, used when Redis is unavailable.
+    Jobs are only visible to the worker that accepted them.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._jobs: dict = {}
+        self._dedup: dict = {}
+        self._seq = itertools.count()
+
+    async def enqueue(self, prompt: str, priority: int, dedup_key: str,
+                      admit: Optional[Callable[[], None]] = None) -> tuple:
+        existing = self._jobs.get(self._dedup.get(dedup_key))
+        if existing and existing["status"] not in FINISHED:
+            return existing, True
+        if admit is not None:
+            admit()
+        job = new_job(prompt, priority, dedup_key)
+        self._jobs[job["id"]] = job
+        self._dedup[dedup_key] = job["id"]
+        await self._queue.put((-priority, next(self._seq), job["id"]))
+        return job, False
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def update(self, job: dict):
+        self._jobs[job["id"]] = dict(job)
+
+    async def next_job(self, timeout: float) -> Optional[str]:
+        try:
+            return (await asyncio.wait_for(self._queue.get(), timeout=timeout))[2]
+        except asyncio.TimeoutError:
+            return None
+
+    async def heartbeat(self, job_id: str):
+        pass  # Jobs live and die with this process; there is no lease to renew
+
+    async def requeue(self, job: dict):
+        job["status"] = QUEUED
+        await self.update(job)
+        await self._queue.put((-job["priority"], next(self._seq), job["id"]))
+
+    async def requeue_expired(self) -> int:
+        return 0
+
+    async def finish(self, job: dict):
+        await self.update(job)
+        if self._dedup.get(job["dedup_key"]) == job["id"]:
+            del self._dedup[job["dedup_key"]]
+        # Forget finished jobs after the same TTL the Redis backend uses
+        asyncio.get_running_loop().call_later(JOB_TTL_SECONDS, self._jobs.pop, job["id"], None)
+
+
+# --- 4. Bounded Worker Pool ---
+class JobWorkerPool:
+    """
+    JOB_MAX_CONCURRENCY tasks draining the queue, plus a reaper that requeues
+    jobs whose worker died (on startup, then every JOB_LEASE_S / 2). The
+    handler receives the job and an on_retry callback, and returns the job's
+    result dict. Jobs interrupted by shutdown are put back on the queue; a
+    queue error mid-job is logged, the worker carries on and the reaper
+    recovers the job once its lease lapses.
+    """
+
+    def __init__(self, handler: Callable, concurrency: int = JOB_MAX_CONCURRENCY):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue = None
+        self._tasks: list = []
+        self.stats = {"completed": 0, "failed": 0, "retries": 0}
+
+    def start(self, queue):
+        self.queue = queue
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._reap()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            try:
+                await self._take_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # A Redis blip must not cost the pool a worker. A job it interrupted keeps
+                # its lease without a heartbeat, so the reaper requeues it once that lapses.
+                print(f"Job Worker Error: {e!r}")
+                await asyncio.sleep(1.0)
+
+    async def _take_next(self):
+        job_id = await self.queue.next_job(timeout=1.0)
+        if job_id is None:
+            return
+        job = await self.queue.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return
+        await self._run(job)
+
+    async def _reap(self):
+        while True:
+            try:
+                recovered = await self.queue.requeue_expired()
+                if recovered:
+                    print(f"Job Worker: requeued {recovered} jobs with expired leases.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job Worker Error: failed to requeue expired jobs: {e}")
+            await asyncio.sleep(JOB_LEASE_S / 2)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_S / 3)
+            try:
+                await self.queue.heartbeat(job_id)
+            except Exception as e:
+                print(f"Job Worker Error: failed to renew lease for {job_id}: {e}")
+
+    async def _run(self, job: dict):
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        try:
+            await self._execute(job)
+        except asyncio.CancelledError:
+            # Shutdown mid-job: hand it back so another worker (or the next boot) runs it
+            job["attempts"] = 0
+            job["error"] = None
+            try:
+                await self.queue.requeue(job)
+            except Exception as e:
+                # Still stop; the reaper picks the job up once its lease lapses
+                print(f"Job Worker Error: failed to requeue {job['id']} on shutdown: {e!r}")
+            raise
+        finally:
+            heartbeat.cancel()
+        await self.queue.finish(job)
+
+    async def _execute(self, job: dict):
+        job["status"] = RUNNING
+        job["attempts"] = 1
+        await self.queue.update(job)
+
+        async def on_retry(attempt: int, error: Exception, delay: float):
+            self.stats["retries"] += 1
+            job["status"] = RETRYING
+            job["attempts"] = attempt + 1
+            job["error"] = f"{error} (retrying in {delay:.1f}s)"
+            await self.queue.update(job)
+
+        try:
+            job["result"] = await self.handler(job, on_retry)
+            job["status"] = DONE
+            job["error"] = None
+            self.stats["completed"] += 1
+        except Exception as e:
+            job["status"] = FAILED
+            job["error"] = str(getattr(e, "detail", e))
+            self.stats["failed"] += 1
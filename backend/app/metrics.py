@@ -0,0 +1,184 @@
+# Save this as backend/app/metrics.py
+
+import asyncio
+import functools
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# --- 1. Settings ---
+# Spans are opt-in and need the opentelemetry-api package (plus an SDK/exporter to ship them)
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+LOOP_LAG_INTERVAL_S = 0.5
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_tracer = None
+if OTEL_ENABLED:
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("ai-tattoo-designer")
+    except ImportError:
+        print("OTEL_ENABLED is set but opentelemetry-api is not installed; spans disabled.")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+# --- 2. Metric Types ---
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> Dict[tuple, float]:
+        return dict(self._values)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(labels)} {value}"
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is a bisect plus two additions, cheap
+    enough to leave on in production.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                bucket_labels = labels + (("le", str(bound)),)
+                yield f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {series[-1]}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+# --- 3. Registry ---
+class MetricsRegistry:
+    """
+    Owns the app's histograms/counters plus "collectors": callbacks that
+    read stats the components already keep (cache, write-behind queue,
+    governor...) at scrape time, so the hot path pays nothing for them.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # (name, type, help, callback -> {labels tuple: value})
+        self._lag_task: Optional[asyncio.Task] = None
+        self.loop_lag = Histogram("event_loop_lag_seconds", "Delay of a scheduled timer on the event loop.")
+        self._metrics.append(self.loop_lag)
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, metric_type: str, help_text: str, callback: Callable[[], Dict[tuple, float]]):
+        self._collectors.append((name, metric_type, help_text, callback))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, metric_type, help_text, callback in self._collectors:
+            try:
+                values = callback()
+            except Exception as e:
+                print(f"Metrics Error: collector {name} failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in values.items():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    # --- Event Loop Lag ---
+    def start(self):
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._measure_loop_lag())
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+    async def _measure_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LOOP_LAG_INTERVAL_S
+            await asyncio.sleep(LOOP_LAG_INTERVAL_S)
+            self.loop_lag.observe(max(0.0, loop.time() - expected))
+
+
+# --- 4. Stage Timing ---
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """
+    Records the block's wall time into the histogram (and an OpenTelemetry
+    span when enabled). Works across awaits since it only reads the clock.
+    """
+    span = None
+    if _tracer is not None:
+        span = _tracer.start_as_current_span("/".join(str(v) for v in labels.values()) or histogram.name)
+        span.__enter__()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+        if span is not None:
+            span.__exit__(None, None, None)
+
+
+def timed_async(histogram: Histogram, **labels):
+    """
+    Decorator form of timed() for async endpoints. functools.wraps keeps the
+    signature visible to FastAPI's dependency injection.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with timed(histogram, **labels):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,78 @@
+# Save this as backend/app/migrations.py
+#
+# Minimal forward-only schema migrations. Run once per deploy, NOT on worker boot:
+#   cd backend && python -m app.migrations
+
+import asyncio
+from sqlalchemy import text
+from app.database import engine, Base
+
+# --- 1. Migration List (append only, never edit a shipped entry) ---
+# Each entry: (version, description, {dialect: [statements]}); "default" covers any dialect.
+# A statement is either raw SQL or a callable run against the sync connection.
+MIGRATIONS = [
+    (
+        1,
+        "Base schema (conversations table)",
+        {
+            "default": [
+                lambda sync_conn: Base.metadata.create_all(sync_conn, checkfirst=True),
+            ],
+        },
+    ),
+    (
+        2,
+        "Composite index for keyset pagination of /api/history",
+        {
+            # CONCURRENTLY avoids locking a large conversations table while the index builds
+            "postgresql": [
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_conversations_timestamp_id "
+                "ON conversations (timestamp, id)",
+            ],
+            "default": [
+                "CREATE INDEX IF NOT EXISTS ix_conversations_timestamp_id "
+                "ON conversations (timestamp, id)",
+            ],
+        },
+    ),
+]
+
+
+# --- 2. Runner ---
+async def applied_versions(conn) -> set:
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description TEXT NOT NULL)"
+    ))
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return {row[0] for row in result}
+
+
+async def run_migrations():
+    """
+    Applies every migration not yet recorded in schema_migrations, in order.
+    Runs in autocommit mode since CREATE INDEX CONCURRENTLY can't run inside a transaction.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        done = await applied_versions(conn)
+        dialect = conn.dialect.name
+
+        for version, description, statements in MIGRATIONS:
+            if version in done:
+                continue
+            print(f"Applying migration {version}: {description}")
+            for statement in statements.get(dialect, statements["default"]):
+                if callable(statement):
+                    await conn.run_sync(statement)
+                else:
+                    await conn.execute(text(statement))
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d)"),
+                {"v": version, "d": description}
+            )
+    print("Migrations complete.")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_migrations())
@@ -0,0 +1,87 @@
+# Save this as backend/app/prompt_normalizer.py
+
+import re
+import unicodedata
+
+# --- 1. Vocabulary ---
+# Words that don't change what gets drawn ("lion on my chest" == "lion chest")
+STOPWORDS = {
+    "a", "an", "the", "my", "me", "i", "i'd", "id", "want", "would", "like", "please",
+    "of", "on", "in", "at", "to", "with", "for", "and", "some", "kind", "tattoo",
+    "design", "idea", "get", "make", "create", "draw", "show", "can", "you", "it",
+}
+
+# Multi-word phrases are folded before tokenizing; order matters (longest first)
+PHRASE_SYNONYMS = [
+    ("black and white", "blackwork"),
+    ("black & white", "blackwork"),
+    ("black n white", "blackwork"),
+    ("b&w", "blackwork"),
+    ("upper arm", "bicep"),
+    ("lower arm", "forearm"),
+    ("fine line", "fineline"),
+    ("neo traditional", "neotraditional"),
+    ("old school", "traditional"),
+    ("water color", "watercolor"),
+]
+
+# Single-word folding for body parts and styles
+WORD_SYNONYMS = {
+    # Body parts
+    "biceps": "bicep",
+    "forearms": "forearm",
+    "chests": "chest", "pec": "chest", "pecs": "chest", "breast": "chest",
+    "shoulders": "shoulder",
+    "backpiece": "back", "spine": "back",
+    "ribs": "rib", "ribcage": "rib",
+    "wrists": "wrist",
+    "ankles": "ankle",
+    "calves": "calf",
+    "thighs": "thigh",
+    "hands": "hand",
+    "necks": "neck",
+    "legs": "leg",
+    # Styles
+    "monochrome": "blackwork", "blackwork-style": "blackwork",
+    "geometrical": "geometric",
+    "minimal": "minimalist", "minimalistic": "minimalist", "simple": "minimalist",
+    "tribals": "tribal",
+    "realistic": "realism", "photorealistic": "realism",
+    "dotwork": "stippling", "pointillism": "stippling",
+    "oldschool": "traditional",
+    "japanese": "irezumi",
+    # Common plurals of subjects
+    "lions": "lion", "wolves": "wolf", "roses": "rose", "skulls": "skull",
+    "snakes": "snake", "dragons": "dragon", "birds": "bird", "flowers": "flower",
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s&'-]")
+_PHRASES = [(re.compile(rf"\b{re.escape(phrase)}\b"), replacement) for phrase, replacement in PHRASE_SYNONYMS]
+
+
+# --- 2. Normalization ---
+def normalize_prompt(user_input: str) -> str:
+    """
+    Reduces a user prompt to a canonical form for cache lookups: lowercase,
+    no punctuation or stopwords, collapsed whitespace, and body-part/style
+    synonyms folded ("Lion on chest" and "lion on my chest " both -> "lion chest").
+    Word order is preserved since it can change the subject.
+    """
+    text = unicodedata.normalize("NFKC", user_input).lower()
+    for pattern, replacement in _PHRASES:
+        text = pattern.sub(replacement, text)
+    text = _PUNCTUATION.sub(" ", text)
+
+    tokens = []
+    for token in text.split():
+        token = token.strip("'-")
+        if not token or token in STOPWORDS:
+            continue
+        token = WORD_SYNONYMS.get(token, token)
+        # Drop immediate repeats created by folding ("biceps arm" -> "bicep")
+        if tokens and tokens[-1] == token:
+            continue
+        tokens.append(token)
+
+    # Never normalize a prompt down to nothing - fall back to the trimmed original
+    return " ".join(tokens) or " ".join(user_input.lower().split())
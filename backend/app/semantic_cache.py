@@ -0,0 +1,121 @@
+# Save this as backend/app/semantic_cache.py
+
+import hashlib
+import math
+import os
+from collections import OrderedDict, defaultdict
+from typing import Dict, Optional, Tuple
+
+# --- 1. Settings ---
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.9))
+SEMANTIC_INDEX_MAX_ENTRIES = int(os.getenv("SEMANTIC_INDEX_MAX_ENTRIES", 50000))
+EMBEDDING_DIMENSIONS = 2 ** 18
+NGRAM_SIZE = 3
+
+# Small words that flip what gets drawn ("no color lion" vs "color lion",
+# "half sleeve" vs "sleeve"). Two prompts only match if they agree on these.
+NEGATIONS = {"no", "not", "without", "non", "never", "dont", "don't"}
+MODIFIERS = {"half", "full", "quarter", "mini", "small", "tiny", "large", "big", "huge"}
+GUARD_TOKENS = NEGATIONS | MODIFIERS
+
+
+# --- 2. Hashed N-Gram Embeddings (No Model, No Network) ---
+def _feature(token: str) -> int:
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % EMBEDDING_DIMENSIONS
+
+
+def embed(normalized_prompt: str) -> Dict[int, float]:
+    """
+    Sparse, L2-normalized vector of hashed word unigrams and character
+    trigrams with sublinear term frequency. Expects normalize_prompt() output,
+    so stopwords are already gone and common words don't dominate.
+    """
+    counts: Dict[int, int] = defaultdict(int)
+    for word in normalized_prompt.split():
+        counts[_feature("w:" + word)] += 1
+        padded = f" {word} "
+        for i in range(len(padded) - NGRAM_SIZE + 1):
+            counts[_feature("c:" + padded[i:i + NGRAM_SIZE])] += 1
+
+    vector = {f: 1.0 + math.log(c) for f, c in counts.items()}
+    norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+    return {f: w / norm for f, w in vector.items()}
+
+
+def compatible(query_tokens: list, candidate_tokens: list) -> bool:
+    """
+    Hard checks applied before a near-duplicate is served. The embedding is a
+    bag of n-grams, so it can't tell a negation or modifier apart from a typo,
+    and it ignores word order.
+    """
+    if GUARD_TOKENS.intersection(query_tokens) != GUARD_TOKENS.intersection(candidate_tokens):
+        return False
+    # Words both prompts share must appear in the same order ("snake dagger" != "dagger snake")
+    shared = set(query_tokens) & set(candidate_tokens)
+    return [t for t in query_tokens if t in shared] == [t for t in candidate_tokens if t in shared]
+
+
+# --- 3. Local Vector Index ---
+class SemanticIndex:
+    """
+    In-process nearest-neighbour index from prompt embeddings to cache keys.
+    An inverted index over features limits scoring to prompts that share at
+    least one n-gram with the query. Oldest entries are evicted first.
+    Candidates above the threshold still have to pass compatible().
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_INDEX_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: "OrderedDict[str, Dict[int, float]]" = OrderedDict()  # cache_key -> vector
+        self._postings: Dict[int, set] = defaultdict(set)                     # feature -> cache_keys
+        self._tokens: Dict[str, list] = {}                                    # cache_key -> prompt words
+        self.stats = {"lookups": 0, "matches": 0}
+
+    def add(self, cache_key: str, normalized_prompt: str):
+        if cache_key in self._vectors:
+            self._vectors.move_to_end(cache_key)
+            return
+        vector = embed(normalized_prompt)
+        self._vectors[cache_key] = vector
+        self._tokens[cache_key] = normalized_prompt.split()
+        for feature in vector:
+            self._postings[feature].add(cache_key)
+        while len(self._vectors) > self.max_entries:
+            self.remove(next(iter(self._vectors)))
+
+    def remove(self, cache_key: str):
+        vector = self._vectors.pop(cache_key, None)
+        if vector is None:
+            return
+        del self._tokens[cache_key]
+        for feature in vector:
+            keys = self._postings.get(feature)
+            if keys is not None:
+                keys.discard(cache_key)
+                if not keys:
+                    del self._postings[feature]
+
+    def nearest(self, normalized_prompt: str) -> Optional[Tuple[str, float]]:
+        """
+        Returns (cache_key, cosine similarity) of the closest compatible indexed
+        prompt at or above the threshold, or None.
+        """
+        self.stats["lookups"] += 1
+        query = embed(normalized_prompt)
+        scores: Dict[str, float] = defaultdict(float)
+        for feature, weight in query.items():
+            for cache_key in self._postings.get(feature, ()):
+                scores[cache_key] += weight * self._vectors[cache_key][feature]
+        query_tokens = normalized_prompt.split()
+        candidates = [key for key, score in scores.items() if score >= self.threshold]
+        for cache_key in sorted(candidates, key=scores.get, reverse=True):
+            if compatible(query_tokens, self._tokens[cache_key]):
+                self.stats["matches"] += 1
+                return cache_key, scores[cache_key]
+        return None
+
+    def __len__(self) -> int:
+        return len(self._vectors)
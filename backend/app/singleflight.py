@@ -0,0 +1,170 @@
+# Save this as backend/app/singleflight.py
+
+import asyncio
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.governor import MAX_WAIT_S, UPSTREAM_TIMEOUT_S
+
+# --- 1. Settings ---
+# Cross-worker coalescing is opt-in: it costs one extra Redis round trip per cache miss.
+DISTRIBUTED_LOCK_ENABLED = os.getenv("SINGLEFLIGHT_REDIS_LOCK", "false").lower() == "true"
+# The holder renews its lease every LOCK_LEASE_MS / 3, so the lease only lapses if the holder dies
+LOCK_LEASE_MS = int(os.getenv("SINGLEFLIGHT_LOCK_LEASE_MS", 10000))
+# Default wait covers the holder's worst case: token + slot queueing, then the full upstream timeout
+LOCK_WAIT_TIMEOUT_S = float(os.getenv("SINGLEFLIGHT_LOCK_WAIT_S", 2 * MAX_WAIT_S + UPSTREAM_TIMEOUT_S + 5))
+LOCK_POLL_INTERVAL_S = 0.1
+# How long waiters can still see that the holder gave up without a result
+LOCK_FAILURE_MARKER_MS = 5000
+
+# Outcomes of wait_for_peer()
+PEER_DONE, PEER_FAILED, PEER_EXPIRED, PEER_TIMEOUT = "done", "failed", "expired", "timeout"
+
+# Deletes the lock only if we still own it (the lease may have expired and been re-taken).
+# A failed holder also leaves a short-lived marker so waiters don't mistake it for a crash.
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    if ARGV[2] == '1' then
+        redis.call('set', KEYS[2], ARGV[1], 'PX', ARGV[3])
+    end
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Extends the lease only if we still own it
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+# --- 2. In-Process Single-Flight ---
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller (the leader)
+    runs the coroutine, every other caller awaits the leader's result.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "leaders": 0,            # Calls that actually ran
+            "coalesced": 0,          # Callers that piggy-backed on an in-flight call
+            "lock_waits": 0,         # Waited on another worker's Redis lock
+            "lock_wait_hits": 0,     # ...and got its result from the cache
+            "lock_timeouts": 0,      # ...and gave up, calling upstream ourselves
+            "lock_peer_failures": 0, # ...and the holder's call failed (shared, not retried)
+            "lock_takeovers": 0,     # ...and the holder's lease lapsed, so we took the lock
+        }
+
+    async def do(self, key: str, fn: Callable[[], Awaitable], on_lead: Optional[Callable[[], None]] = None):
+        """
+        on_lead runs synchronously only if this caller becomes the leader, before
+        fn starts (e.g. to charge a quota). If it raises, nothing is registered
+        and only this caller sees the error, never the followers.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            if on_lead is not None:
+                on_lead()
+            self.stats["leaders"] += 1
+            # Run as a separate task so a disconnecting leader doesn't cancel its followers
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved; callers already received it
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+
+# --- 3. Cross-Worker Lock (Redis Lease) ---
+async def acquire_lock(redis_client, key: str) -> Optional[str]:
+    """
+    Tries to take the generation lock for a cache key. Returns the owner
+    token on success, None if another worker holds it.
+    """
+    token = uuid.uuid4().hex
+    acquired = await redis_client.set(f"lock:{key}", token, nx=True, px=LOCK_LEASE_MS)
+    if not acquired:
+        return None
+    await redis_client.delete(f"lockfail:{key}")  # A previous holder's failure is no longer news
+    return token
+
+
+async def release_lock(redis_client, key: str, token: str, failed: bool = False):
+    await redis_client.eval(
+        _RELEASE_SCRIPT, 2, f"lock:{key}", f"lockfail:{key}", token, "1" if failed else "0", LOCK_FAILURE_MARKER_MS
+    )
+
+
+async def _renew_lock(redis_client, key: str, token: str):
+    while True:
+        await asyncio.sleep(LOCK_LEASE_MS / 3000)
+        try:
+            if not await redis_client.eval(_RENEW_SCRIPT, 1, f"lock:{key}", token, LOCK_LEASE_MS):
+                return  # Lost the lock (e.g. Redis restarted); nothing left to renew
+        except Exception as e:
+            print(f"Single-Flight Warning: failed to renew lock for {key}: {e}")
+
+
+@asynccontextmanager
+async def hold_lock(redis_client, key: str, token: str):
+    """
+    Keeps the lease alive while the body runs, however long the upstream call
+    takes, then releases it. If the body raises, waiters are told it failed.
+    """
+    renewer = asyncio.create_task(_renew_lock(redis_client, key, token))
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        renewer.cancel()
+        await release_lock(redis_client, key, token, failed=failed)
+
+
+async def wait_for_peer(redis_client, key: str) -> tuple:
+    """
+    Polls until the lock holder publishes its result to the cache. Returns
+    (outcome, value):
+      PEER_DONE    - value is the cached design
+      PEER_FAILED  - the holder released without writing (its call failed)
+      PEER_EXPIRED - the holder's lease lapsed (it died); value is our lock
+                     token, so exactly one waiter takes over the generation
+      PEER_TIMEOUT - gave up after LOCK_WAIT_TIMEOUT_S
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + LOCK_WAIT_TIMEOUT_S
+    while loop.time() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL_S)
+        cached_data = await redis_client.hgetall(key)
+        if cached_data and 'image_hash' in cached_data:
+            return PEER_DONE, cached_data
+        if await redis_client.exists(f"lock:{key}"):
+            continue
+        # The holder may have written and released between our two reads
+        cached_data = await redis_client.hgetall(key)
+        if cached_data and 'image_hash' in cached_data:
+            return PEER_DONE, cached_data
+        if await redis_client.exists(f"lockfail:{key}"):
+            return PEER_FAILED, None
+        # Released with no result and no failure marker: the lease lapsed.
+        # Race the other waiters for the lock; the losers keep waiting on the winner.
+        token = await acquire_lock(redis_client, key)
+        if token is not None:
+            return PEER_EXPIRED, token
+    return PEER_TIMEOUT, None
@@ -0,0 +1,158 @@
+# Save this as backend/app/write_behind.py
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import insert
+from app.database import AsyncSessionLocal, Conversation
+
+# --- 1. Settings ---
+BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", 200))
+FLUSH_INTERVAL_MS = int(os.getenv("DB_WRITE_FLUSH_MS", 250))
+QUEUE_MAX_SIZE = int(os.getenv("DB_WRITE_QUEUE_SIZE", 10000))
+# How long a producer blocks on a full queue before the row is dropped
+ENQUEUE_TIMEOUT_S = float(os.getenv("DB_WRITE_ENQUEUE_TIMEOUT_S", 1.0))
+
+
+def conversation_row(role: str, prompt_text: str, generated_image_url: Optional[str] = None,
+                     engineered_prompt: Optional[str] = None) -> dict:
+    return {
+        "role": role,
+        "prompt_text": prompt_text,
+        "generated_image_url": generated_image_url,
+        "engineered_prompt": engineered_prompt,
+        # Stamp now, not at flush time, so history order matches request order
+        "timestamp": datetime.utcnow(),
+    }
+
+
+# --- 2. Write-Behind Queue ---
+class ConversationWriter:
+    """
+    Batches Conversation rows in memory and writes them with one multi-row
+    INSERT every BATCH_SIZE rows or FLUSH_INTERVAL_MS, whichever comes first.
+    Rows are written in the order they were submitted.
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE, flush_interval_ms: int = FLUSH_INTERVAL_MS,
+                 max_size: int = QUEUE_MAX_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,          # Queue stayed full past ENQUEUE_TIMEOUT_S
+            "failed": 0,           # Rows lost to a failed flush
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Drains everything still queued, then stops the flush loop.
+        """
+        if self._task is None:
+            return
+        await self._queue.put(None)  # Sentinel: flush what's left and exit
+        await self._task
+        self._task = None
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, role: str, prompt_text: str, generated_image_url: Optional[str] = None,
+                     engineered_prompt: Optional[str] = None) -> bool:
+        """
+        Queues one row. Blocks (backpressure) while the queue is full, dropping
+        the row after ENQUEUE_TIMEOUT_S. Returns False if the row was dropped.
+        """
+        row = conversation_row(role, prompt_text, generated_image_url, engineered_prompt)
+        try:
+            await asyncio.wait_for(self._queue.put(row), timeout=ENQUEUE_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            self.stats["dropped"] += 1
+            print(f"Write-Behind Warning: queue full, dropped {role} message.")
+            return False
+        self.stats["enqueued"] += 1
+        return True
+
+    def submit_many(self, rows: List[dict]) -> int:
+        """
+        Queues pre-built rows (see conversation_row) back to back without
+        awaiting, so they go out together in the same multi-row INSERT (up to
+        BATCH_SIZE rows per statement). Safe to call from cleanup code. Rows
+        that don't fit in the queue are dropped; returns how many were queued.
+        """
+        queued = 0
+        for row in rows:
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                self.stats["dropped"] += len(rows) - queued
+                print(f"Write-Behind Warning: queue full, dropped {len(rows) - queued} messages.")
+                break
+            queued += 1
+        self.stats["enqueued"] += queued
+        return queued
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            # Wait for the first row, then collect until the batch fills or the interval elapses
+            row = await self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+        # Shutdown: write out anything that arrived after the sentinel
+        remaining = []
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row is not None:
+                remaining.append(row)
+        for i in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[i:i + self.batch_size])
+
+    async def _flush(self, batch: List[dict]):
+        started = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                # One multi-row INSERT ... VALUES (...), (...) per batch
+                await db.execute(insert(Conversation).values(batch))
+                await db.commit()
+            self.stats["written"] += len(batch)
+        except Exception as e:
+            # Crucial to catch errors here - an exception would kill the flush loop
+            self.stats["failed"] += len(batch)
+            print(f"Write-Behind Error: Failed to write {len(batch)} rows to DB: {e}")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["flushes"] += 1
+        self.stats["last_flush_ms"] = elapsed_ms
+        self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], elapsed_ms)
+        self.stats["total_flush_ms"] += elapsed_ms
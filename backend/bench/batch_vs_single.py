@@ -0,0 +1,77 @@
+# Save this as backend/bench/batch_vs_single.py
+#
+# One POST /api/generate_tattoo/batch of N prompts against N concurrent POST
+# /api/generate_tattoo calls, first cold (every prompt misses the cache) and
+# then warm (every prompt hits). Stub Imagen client with fixed latency and
+# fakeredis; client quotas are lifted so only the pipeline is measured:
+#   cd backend && python bench/batch_vs_single.py [--prompts 50] [--variants 1] [--delay 0.5]
+# The batch runs BATCH_CONCURRENCY (8) Imagen calls at a time; set the env var to compare.
+
+import argparse
+import asyncio
+import json
+import time
+
+from harness import Stopwatch, asgi_client, load_app
+
+
+async def singles(client, prompts: list) -> dict:
+    first = None
+    started = time.perf_counter()
+
+    async def one(prompt: str):
+        nonlocal first
+        response = await client.post("/api/generate_tattoo", json={"user_prompt": prompt})
+        response.raise_for_status()
+        first = first or time.perf_counter() - started
+
+    with Stopwatch() as wall:
+        await asyncio.gather(*(one(prompt) for prompt in prompts))
+    return {"requests": len(prompts), "results": len(prompts), "first": first, "wall": wall.elapsed}
+
+
+async def batch(client, prompts: list, variants: int) -> dict:
+    first, results = None, 0
+    started = time.perf_counter()
+    with Stopwatch() as wall:
+        async with client.stream("POST", "/api/generate_tattoo/batch",
+                                 json={"user_prompts": prompts, "variants": variants}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line and json.loads(line)["status"] == "success":
+                    results += 1
+                    first = first or time.perf_counter() - started
+    return {"requests": 1, "results": results, "first": first, "wall": wall.elapsed}
+
+
+async def run(args):
+    bench = load_app(args.delay)
+    print(f"{args.prompts} prompts x {args.variants} variants, stub Imagen latency {args.delay}s, "
+          f"BATCH_CONCURRENCY={bench.main.BATCH_CONCURRENCY}")
+    print(f"{'mode':>8} {'cache':>5} {'HTTP reqs':>9} {'Imagen calls':>12} {'results':>8} {'first(s)':>9} {'wall(s)':>8}")
+
+    async with asgi_client(bench) as client:
+        for name in ("singles", "batch"):
+            prompts = [f"{name} bench design {n}" for n in range(args.prompts)]
+            for cache in ("cold", "warm"):
+                calls_before = bench.stub.calls
+                if name == "singles":
+                    result = await singles(client, prompts)
+                else:
+                    result = await batch(client, prompts, args.variants)
+                print(f"{name:>8} {cache:>5} {result['requests']:>9} {bench.stub.calls - calls_before:>12} "
+                      f"{result['results']:>8} {result['first']:>9.2f} {result['wall']:>8.2f}")
+    if args.variants > 1:
+        print(f"(singles return 1 design per prompt; the batch returns {args.variants} from the same Imagen call)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch endpoint vs N concurrent single generations.")
+    parser.add_argument("--prompts", type=int, default=50)
+    parser.add_argument("--variants", type=int, default=1, choices=range(1, 5))
+    parser.add_argument("--delay", type=float, default=0.5, help="Stub Imagen latency per call (s)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
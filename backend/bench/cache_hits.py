@@ -0,0 +1,122 @@
+# Save this as backend/bench/cache_hits.py
+#
+# Cache-hit latency of DesignCache.get with and without the in-process tier.
+# Every lookup is a hit; keys are drawn with a Zipf-like skew (a few popular
+# prompts, a long tail). Without --redis-url it runs against fakeredis with a
+# simulated network round trip per Redis command/pipeline (--rtt-ms):
+#   cd backend && python bench/cache_hits.py [--keys 5000] [--lookups 50000] [--rtt-ms 0.3]
+#   cd backend && python bench/cache_hits.py --redis-url redis://localhost:6379/15   # Real Redis (uses that DB)
+
+import argparse
+import asyncio
+import random
+import time
+
+from harness import percentile
+
+from app.cache import DesignCache, LocalCache
+
+
+# --- 1. Redis With Network Latency ---
+class DelayedPipeline:
+    def __init__(self, pipe, rtt: float):
+        self._pipe = pipe
+        self._rtt = rtt
+
+    async def __aenter__(self):
+        await self._pipe.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._pipe.__aexit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._pipe, name)  # Queued commands: no round trip yet
+
+    async def execute(self):
+        await asyncio.sleep(self._rtt)
+        return await self._pipe.execute()
+
+
+class DelayedRedis:
+    """
+    fakeredis with one simulated round trip per command or pipeline execute.
+    """
+
+    def __init__(self, redis, rtt: float):
+        self._redis = redis
+        self._rtt = rtt
+
+    def pipeline(self, transaction: bool = True):
+        return DelayedPipeline(self._redis.pipeline(transaction=transaction), self._rtt)
+
+    def __getattr__(self, name):
+        command = getattr(self._redis, name)
+        if not asyncio.iscoroutinefunction(command):
+            return command
+
+        async def delayed(*args, **kwargs):
+            await asyncio.sleep(self._rtt)
+            return await command(*args, **kwargs)
+        return delayed
+
+
+# --- 2. Benchmark ---
+def skewed_keys(keys: list, count: int) -> list:
+    weights = [1 / (rank + 1) for rank in range(len(keys))]
+    return random.choices(keys, weights=weights, k=count)
+
+
+async def measure(cache: DesignCache, lookups: list) -> list:
+    latencies = []
+    for key in lookups:
+        started = time.perf_counter()
+        design = await cache.get(key)
+        latencies.append(time.perf_counter() - started)
+        assert design is not None
+    return latencies
+
+
+async def run(args):
+    if args.redis_url:
+        import redis.asyncio as aioredis
+        redis = aioredis.Redis.from_url(args.redis_url, decode_responses=True)
+        await redis.flushdb()
+        target = f"redis at {args.redis_url}"
+    else:
+        import fakeredis
+        redis = DelayedRedis(fakeredis.FakeAsyncRedis(decode_responses=True), args.rtt_ms / 1000)
+        target = f"fakeredis + {args.rtt_ms}ms simulated RTT"
+
+    keys = [f"bench-design-{n}" for n in range(args.keys)]
+    seeding = DesignCache(redis, local=LocalCache(max_entries=0, max_bytes=0))
+    for key in keys:
+        await seeding.set(key, {"ai_text": f"Here is your design for {key}", "image_hash": "f" * 64})
+    lookups = skewed_keys(keys, args.lookups)
+
+    print(f"{target}: {args.keys} cached designs, {args.lookups} Zipf-skewed hits")
+    print(f"{'tier':>12} {'p50(us)':>9} {'p99(us)':>9} {'mean(us)':>9} {'local hits':>11}")
+    configs = (
+        ("redis only", LocalCache(max_entries=0, max_bytes=0)),
+        ("local+redis", LocalCache(max_entries=args.local_entries)),
+    )
+    for name, local in configs:
+        cache = DesignCache(redis, local=local)
+        latencies = await measure(cache, lookups)
+        hit_share = local.stats["hits"] / len(lookups)
+        print(f"{name:>12} {percentile(latencies, 0.5) * 1e6:>9.1f} {percentile(latencies, 0.99) * 1e6:>9.1f} "
+              f"{sum(latencies) / len(latencies) * 1e6:>9.1f} {hit_share:>11.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DesignCache hit latency with and without the local tier.")
+    parser.add_argument("--keys", type=int, default=5000, help="Distinct cached designs")
+    parser.add_argument("--lookups", type=int, default=50000)
+    parser.add_argument("--local-entries", type=int, default=10000, help="LOCAL_CACHE_MAX_ENTRIES")
+    parser.add_argument("--rtt-ms", type=float, default=0.3, help="Simulated Redis round trip (fakeredis only)")
+    parser.add_argument("--redis-url", help="Benchmark a real Redis instead (its DB is flushed)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
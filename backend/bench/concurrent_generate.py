@@ -0,0 +1,62 @@
+# Save this as backend/bench/concurrent_generate.py
+#
+# How many concurrent /api/generate_tattoo requests one worker serves at once.
+# Fires N distinct prompts (all cache misses) at the app through ASGI against a
+# stub Imagen client with fixed latency and fakeredis. Non-blocking calls should
+# finish in about one call's latency regardless of N:
+#   cd backend && python bench/concurrent_generate.py [--delay 0.5] [--levels 1 10 50 100]
+#   cd backend && python bench/concurrent_generate.py --blocking   # Baseline: sync client blocking the loop
+
+import argparse
+import asyncio
+import time
+
+from harness import StubImagen, Stopwatch, asgi_client, load_app, percentile
+
+
+async def run_level(bench, concurrency: int, round_id: int) -> tuple:
+    latencies = []
+
+    async def one(client, n: int):
+        started = time.perf_counter()
+        response = await client.post("/api/generate_tattoo", json={"user_prompt": f"bench {round_id} design {n}"})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+    async with asgi_client(bench) as client:
+        with Stopwatch() as wall:
+            await asyncio.gather(*(one(client, n) for n in range(concurrency)))
+    return wall.elapsed, latencies
+
+
+class BlockingImagen(StubImagen):
+    # What the pre-async code did: the Gemini call held the event loop for its whole duration
+    async def generate_images(self, model, prompt, config):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.response(prompt, config)
+
+
+async def run(args):
+    bench = load_app(stub=(BlockingImagen if args.blocking else StubImagen)(args.delay))
+    mode = "blocking client" if args.blocking else "async client"
+    print(f"{mode}: stub Imagen latency {args.delay}s, fakeredis, all cache misses")
+    print(f"{'N':>5} {'wall(s)':>8} {'x one call':>10} {'p50(s)':>7} {'p99(s)':>7} {'req/s':>7}")
+    for round_id, concurrency in enumerate(args.levels):
+        calls_before = bench.stub.calls
+        wall, latencies = await run_level(bench, concurrency, round_id)
+        assert bench.stub.calls - calls_before == concurrency, "every prompt should miss the cache"
+        print(f"{concurrency:>5} {wall:>8.2f} {wall / args.delay:>10.1f} {percentile(latencies, 0.5):>7.2f} "
+              f"{percentile(latencies, 0.99):>7.2f} {concurrency / wall:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent distinct generations against a stub Imagen client.")
+    parser.add_argument("--delay", type=float, default=0.5, help="Stub Imagen latency per call (s)")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 50, 100], help="Concurrent requests per round")
+    parser.add_argument("--blocking", action="store_true", help="Simulate the old blocking Gemini client")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Save this as backend/bench/derivative_encode.py
+#
+# Thumbnail/preview encoding through the process pool: one pool call per
+# variant (the source pickled and decoded for each of the 2 widths x N formats)
+# against one render_all call per image (sent and decoded once). Reports bytes
+# sent to the pool and encode throughput per core on Imagen-sized PNGs:
+#   cd backend && python bench/derivative_encode.py [--images 40] [--workers 4] [--size 1024]
+
+import argparse
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import harness  # noqa: F401  (puts backend/ on sys.path)
+
+from app.derivatives import VARIANTS, render, render_all, supported_formats
+
+
+def source_png(size: int, seed: int) -> bytes:
+    # Noise over a gradient: compresses about as badly as a real generated image
+    from PIL import Image, ImageChops
+
+    gradient = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    noise = Image.effect_noise((size, size), 40 + seed % 20).convert("RGB")
+    out = io.BytesIO()
+    ImageChops.add(gradient, noise, scale=2).save(out, format="PNG")
+    return out.getvalue()
+
+
+async def per_variant(executor, data: bytes, variants: list) -> int:
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(executor, render, data, width, fmt) for width, fmt in variants))
+    return len(data) * len(variants)
+
+
+async def single_call(executor, data: bytes, variants: list) -> int:
+    await asyncio.get_running_loop().run_in_executor(executor, render_all, data, variants)
+    return len(data)
+
+
+async def run(args):
+    formats = supported_formats()
+    variants = [(width, fmt) for width in VARIANTS.values() for fmt in formats]
+    sources = [source_png(args.size, n) for n in range(args.images)]
+    average = sum(map(len, sources)) / len(sources)
+    cores = min(args.workers, os.cpu_count() or 1)
+    print(f"{args.images} PNGs {args.size}x{args.size} (avg {average / 1e6:.2f} MB), "
+          f"{len(variants)} variants each ({', '.join(f'{w}.{f}' for w, f in variants)}), {args.workers} workers on {cores} cores")
+    print(f"{'mode':>12} {'MB sent/img':>12} {'images/s':>9} {'img/s/core':>11} {'wall(s)':>8}")
+
+    for name, mode in (("per-variant", per_variant), ("render_all", single_call)):
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            await mode(executor, sources[0], variants)  # Warm up the worker processes
+            started = time.perf_counter()
+            sent = sum(await asyncio.gather(*(mode(executor, data, variants) for data in sources)))
+            wall = time.perf_counter() - started
+        print(f"{name:>12} {sent / len(sources) / 1e6:>12.2f} {len(sources) / wall:>9.1f} "
+              f"{len(sources) / wall / cores:>11.2f} {wall:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Derivative encoding: per-variant pool calls vs one render_all call.")
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--size", type=int, default=1024, help="Source width/height (Imagen 1:1 is 1024)")
+    parser.add_argument("--workers", type=int, default=4, help="Encoder processes (DERIVATIVE_WORKERS)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
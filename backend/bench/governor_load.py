@@ -0,0 +1,160 @@
+# Save this as backend/bench/governor_load.py
+#
+# Load test for the upstream governor against a local fake Gemini that injects
+# latency, throttling, errors and an outage window. No network, no API key:
+#   cd backend && python bench/governor_load.py [--clients 64] [--duration 30]
+#   cd backend && python bench/governor_load.py --no-governor   # Baseline: direct calls
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import governor as governor_module
+from app.governor import AIMDLimiter, CircuitBreaker, TokenBucket, UpstreamGovernor, UpstreamUnavailable
+
+
+# --- 1. Fake Upstream ---
+class FakeUpstreamError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"fake upstream error {code}")
+        self.code = code
+
+
+class FakeGemini:
+    """
+    Models an upstream with `capacity` concurrent slots: calls beyond it are
+    throttled (429) quickly, latency grows as it nears capacity, a fraction
+    of calls fail with 500, and during the outage window calls hang and fail.
+    """
+
+    def __init__(self, capacity: int, latency_s: float, error_rate: float, outage: tuple):
+        self.capacity = capacity
+        self.latency_s = latency_s
+        self.error_rate = error_rate
+        self.outage_start, self.outage_end = outage
+        self.in_flight = 0
+        self.started = time.monotonic()
+
+    async def generate(self):
+        elapsed = time.monotonic() - self.started
+        if self.outage_start <= elapsed < self.outage_end:
+            await asyncio.sleep(self.latency_s * 4)
+            raise FakeUpstreamError(503)
+        if self.in_flight >= self.capacity:
+            await asyncio.sleep(0.02)
+            raise FakeUpstreamError(429)
+
+        self.in_flight += 1
+        try:
+            load = self.in_flight / self.capacity
+            congestion = 1 + max(0.0, load - 0.7) * 5
+            await asyncio.sleep(self.latency_s * random.lognormvariate(0, 0.3) * congestion)
+            if random.random() < self.error_rate:
+                raise FakeUpstreamError(500)
+            return "image"
+        finally:
+            self.in_flight -= 1
+
+
+# --- 2. Load Generator ---
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run(args) -> dict:
+    governor_module.UPSTREAM_TIMEOUT_S = args.timeout
+    governor_module.MAX_WAIT_S = args.max_wait
+    upstream = FakeGemini(args.capacity, args.latency, args.error_rate, (args.outage_start, args.outage_start + args.outage_length))
+    governor = UpstreamGovernor(
+        is_throttle=lambda e: getattr(e, "code", None) == 429,
+        is_server_error=lambda e: (getattr(e, "code", None) or 0) >= 500,
+    )
+    governor.global_bucket = TokenBucket(args.rate, args.burst)
+    governor.limiter = AIMDLimiter(initial=args.initial_limit, latency_target=args.latency * 3)
+    governor.breaker = CircuitBreaker(open_seconds=args.breaker_open)
+
+    windows = defaultdict(lambda: {"latencies": [], "outcomes": Counter(), "limit": 0.0, "breaker": ""})
+    deadline = time.monotonic() + args.duration
+    started = time.monotonic()
+
+    async def call():
+        if args.no_governor:
+            return await asyncio.wait_for(upstream.generate(), timeout=args.timeout)
+        return await governor.call(upstream.generate)
+
+    async def client_loop():
+        while time.monotonic() < deadline:
+            t0 = time.monotonic()
+            try:
+                await call()
+                outcome = "ok"
+            except UpstreamUnavailable as e:
+                outcome = f"refused_{e.status_code}"
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+            except FakeUpstreamError as e:
+                outcome = f"upstream_{e.code}"
+            window = windows[int(t0 - started)]
+            window["latencies"].append(time.monotonic() - t0)
+            window["outcomes"][outcome] += 1
+            window["limit"] = governor.limiter.limit
+            window["breaker"] = governor.breaker.state
+            await asyncio.sleep(args.think_time * random.random())
+
+    await asyncio.gather(*(client_loop() for _ in range(args.clients)))
+    return windows
+
+
+# --- 3. Report ---
+def report(windows: dict, args):
+    mode = "direct (no governor)" if args.no_governor else "governed"
+    print(f"{mode}: {args.clients} clients, capacity {args.capacity}, latency {args.latency}s, "
+          f"error rate {args.error_rate:.0%}, outage {args.outage_start}s+{args.outage_length}s")
+    print(f"{'t(s)':>4} {'ok/s':>5} {'fail/s':>6} {'p50(s)':>7} {'p99(s)':>7} {'limit':>6}  breaker    outcomes")
+    all_latencies, totals = [], Counter()
+    for second in sorted(windows):
+        window = windows[second]
+        outcomes = window["outcomes"]
+        ok = outcomes["ok"]
+        failed = sum(outcomes.values()) - ok
+        all_latencies.extend(window["latencies"])
+        totals.update(outcomes)
+        print(f"{second:>4} {ok:>5} {failed:>6} {percentile(window['latencies'], 0.5):>7.2f} "
+              f"{percentile(window['latencies'], 0.99):>7.2f} {window['limit']:>6.1f}  {window['breaker']:<9}  "
+              f"{dict(o for o in outcomes.items() if o[0] != 'ok')}")
+    print(f"total: {totals['ok']} ok in {args.duration}s ({totals['ok'] / args.duration:.1f}/s), "
+          f"p99 {percentile(all_latencies, 0.99):.2f}s, {dict(totals)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the upstream governor against a fake Gemini.")
+    parser.add_argument("--clients", type=int, default=64, help="Concurrent closed-loop clients")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--capacity", type=int, default=16, help="Fake upstream concurrent capacity")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake upstream base latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Share of calls failing with 500")
+    parser.add_argument("--outage-start", type=float, default=10, help="Outage window start (s)")
+    parser.add_argument("--outage-length", type=float, default=5, help="Outage window length (s); 0 disables")
+    parser.add_argument("--timeout", type=float, default=5, help="Upstream timeout (GEMINI_TIMEOUT_S)")
+    parser.add_argument("--max-wait", type=float, default=1, help="Max queueing for a token/slot (GOVERNOR_MAX_WAIT_S)")
+    parser.add_argument("--rate", type=float, default=100, help="Global token bucket rate (calls/s)")
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--initial-limit", type=int, default=8)
+    parser.add_argument("--breaker-open", type=float, default=2, help="Seconds the breaker stays open")
+    parser.add_argument("--think-time", type=float, default=0.05, help="Max pause between a client's calls (s)")
+    parser.add_argument("--no-governor", action="store_true", help="Call the fake upstream directly")
+    args = parser.parse_args()
+    report(asyncio.run(run(args)), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Save this as backend/bench/harness.py
+#
+# Shared setup for the benches in this folder: a throwaway SQLite database and
+# blob directory, a stub Imagen client with fixed latency and fakeredis, wired
+# into main the same way the tests do. Needs requirements-dev.txt installed.
+# Import it before main (it sets the environment main reads at import time).
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# --- 1. Bench Environment (must be set before main is imported) ---
+TMP_DIR = tempfile.mkdtemp(prefix="tattoo-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{TMP_DIR}/bench.sqlite")
+os.environ.setdefault("GEMINI_API_KEY", "bench-key")
+os.environ.setdefault("BLOB_STORE_DIR", os.path.join(TMP_DIR, "blobs"))
+os.environ.setdefault("DERIVATIVE_DIR", os.path.join(TMP_DIR, "derivatives"))
+# The governor is benchmarked on its own (governor_load.py); keep it out of the way here
+for name, value in (("GOVERNOR_CLIENT_RATE", "100000"), ("GOVERNOR_CLIENT_BURST", "100000"),
+                    ("GOVERNOR_GLOBAL_RATE", "100000"), ("GOVERNOR_GLOBAL_BURST", "100000"),
+                    ("GOVERNOR_CONCURRENCY_INITIAL", "10000"), ("GOVERNOR_CONCURRENCY_MAX", "10000")):
+    os.environ.setdefault(name, value)
+
+
+# --- 2. Stub Imagen Client ---
+class StubImagen:
+    """
+    Stands in for client.aio.models: sleeps `delay` seconds per call (like a
+    real Imagen round trip, without holding the event loop) and returns one
+    fake PNG per requested image.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_images(self, model, prompt, config):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.response(prompt, config)
+
+    @staticmethod
+    def response(prompt: str, config: dict) -> SimpleNamespace:
+        images = [
+            SimpleNamespace(image=SimpleNamespace(
+                image_bytes=b"\x89PNG\r\n\x1a\n" + f"{prompt}:{n}".encode(), mime_type="image/png"
+            ))
+            for n in range(config.get("number_of_images", 1))
+        ]
+        return SimpleNamespace(generated_images=images)
+
+
+def load_app(delay: float = 0.5, stub: StubImagen = None) -> SimpleNamespace:
+    """
+    Imports main with a stub client (StubImagen(delay) unless given), fakeredis
+    and fresh loop-bound components. Call it inside the event loop the bench
+    runs on.
+    """
+    import fakeredis
+    import main
+    from app.cache import DesignCache
+    from app.governor import UpstreamGovernor
+    from app.singleflight import SingleFlight
+    from app.write_behind import ConversationWriter
+
+    stub = stub or StubImagen(delay)
+    fake_redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    main.client = SimpleNamespace(aio=SimpleNamespace(models=stub))
+    main.redis_client = fake_redis
+    main.design_cache = DesignCache(fake_redis)
+    main.generation_flight = SingleFlight()
+    main.conversation_writer = ConversationWriter()
+    main.governor = UpstreamGovernor(main.governor.is_throttle, main.governor.is_server_error)
+    main.derivative_store.precompute = lambda image_hash, data: None
+    return SimpleNamespace(main=main, stub=stub, redis=fake_redis)
+
+
+async def migrate_and_seed(rows: int, role: str = "bench") -> str:
+    """
+    Runs the migrations on the bench database and bulk-inserts `rows`
+    conversation rows one second apart. Returns the SQLite file path.
+    """
+    import sqlite3
+    from app.database import engine
+    from app.migrations import run_migrations
+
+    await run_migrations()
+    with sqlite3.connect(engine.url.database) as conn:
+        # One recursive-CTE INSERT; timestamps in the format SQLAlchemy writes (microseconds included)
+        conn.execute(
+            """
+            WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO conversations (timestamp, role, prompt_text, generated_image_url, engineered_prompt)
+            SELECT datetime('2024-01-01', '+' || i || ' seconds') || '.000000', ?, printf('%.200c', 'x'), NULL, NULL FROM n
+            """,
+            (rows, role),
+        )
+    return engine.url.database
+
+
+def asgi_client(app):
+    import httpx
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app.main.app), base_url="http://bench")
+
+
+# --- 3. Measurement Helpers ---
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class Stopwatch:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
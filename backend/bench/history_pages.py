@@ -0,0 +1,80 @@
+# Save this as backend/bench/history_pages.py
+#
+# Per-page latency of /api/history at increasing depths: the (timestamp, id)
+# keyset cursor against the OFFSET query it replaced. Keyset pages should cost
+# the same at any depth; OFFSET pages grow with the number of rows skipped.
+# SQLite stand-in for Postgres (same index, same query shape):
+#   cd backend && python bench/history_pages.py [--rows 1000000] [--depths 1 100 1000 10000]
+
+import argparse
+import asyncio
+
+from harness import Stopwatch, asgi_client, load_app, migrate_and_seed, percentile
+
+
+async def run(args):
+    bench = load_app()
+    main = bench.main
+    print(f"Seeding {args.rows} rows...")
+    await migrate_and_seed(args.rows)
+    from sqlalchemy import tuple_
+    from sqlalchemy.future import select
+    from app.database import Conversation, ReplicaSessionLocal
+
+    newest_first = select(*main.HISTORY_COLUMNS).order_by(Conversation.timestamp.desc(), Conversation.id.desc())
+
+    async def cursor_for(depth: int):
+        # Cursor the client would hold after `depth` pages (setup only, not timed)
+        if depth == 0:
+            return None
+        async with ReplicaSessionLocal() as db:
+            row = (await db.execute(newest_first.offset(depth * args.limit - 1).limit(1))).one()
+        return main.encode_cursor(row.timestamp, row.id)
+
+    async def keyset_page(cursor):
+        query = newest_first
+        if cursor:
+            ts, row_id = main.decode_cursor(cursor)
+            query = query.where(tuple_(Conversation.timestamp, Conversation.id) < tuple_(ts, row_id))
+        async with ReplicaSessionLocal() as db:
+            return (await db.execute(query.limit(args.limit + 1))).all()
+
+    async def offset_page(depth: int):
+        async with ReplicaSessionLocal() as db:
+            return (await db.execute(newest_first.offset(depth * args.limit).limit(args.limit + 1))).all()
+
+    async def endpoint_page(client, cursor):
+        response = await client.get("/api/history", params={"limit": args.limit, **({"before": cursor} if cursor else {})})
+        response.raise_for_status()
+
+    print(f"{args.rows} rows, {args.limit} per page, {args.repeat} requests per depth (p50 / p99 ms)")
+    print(f"{'page':>7} {'keyset query':>15} {'offset query':>15} {'/api/history':>15}")
+    async with asgi_client(bench) as client:
+        for depth in args.depths:
+            if depth * args.limit >= args.rows:
+                break
+            cursor = await cursor_for(depth)
+            timings = {"keyset": [], "offset": [], "endpoint": []}
+            for _ in range(args.repeat):
+                for name, page in (("keyset", lambda: keyset_page(cursor)), ("offset", lambda: offset_page(depth)),
+                                   ("endpoint", lambda: endpoint_page(client, cursor))):
+                    with Stopwatch() as watch:
+                        await page()
+                    timings[name].append(watch.elapsed * 1000)
+            print(f"{depth:>7} " + " ".join(
+                f"{percentile(timings[name], 0.5):>7.2f} /{percentile(timings[name], 0.99):>6.2f}"
+                for name in ("keyset", "offset", "endpoint")
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History page latency by depth: keyset cursor vs OFFSET.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=50, help="Rows per page")
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 10, 100, 1000, 10000], help="Pages from the newest")
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Save this as backend/bench/metrics_overhead.py
+#
+# Per-call cost of the stage timing instrumentation: timed() around an empty
+# block vs the bare block, the timed_async decorator vs a plain await, and
+# Histogram.observe on its own. Spans are off unless OTEL_ENABLED=true:
+#   cd backend && python bench/metrics_overhead.py [--iterations 200000]
+#   cd backend && OTEL_ENABLED=true python bench/metrics_overhead.py   # With OpenTelemetry spans
+
+import argparse
+import asyncio
+import time
+
+import harness  # noqa: F401  (puts backend/ on sys.path)
+
+from app.metrics import Histogram, OTEL_ENABLED, timed, timed_async
+
+
+def per_call_ns(fn, iterations: int) -> float:
+    # Best of 5 runs: the least disturbed by the scheduler and GC
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        fn(iterations)
+        best = min(best, time.perf_counter() - started)
+    return best / iterations * 1e9
+
+
+async def per_call_ns_async(fn, iterations: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        await fn(iterations)
+        best = min(best, time.perf_counter() - started)
+    return best / iterations * 1e9
+
+
+def run(args):
+    histogram = Histogram("bench_seconds", "Bench histogram.")
+
+    def bare_block(n):
+        for _ in range(n):
+            pass
+
+    def timed_block(n):
+        for _ in range(n):
+            with timed(histogram, stage="bench"):
+                pass
+
+    def observe_only(n):
+        for _ in range(n):
+            histogram.observe(0.001, stage="bench")
+
+    async def endpoint():
+        return None
+
+    decorated = timed_async(histogram, stage="bench")(endpoint)
+
+    async def plain_awaits(n):
+        for _ in range(n):
+            await endpoint()
+
+    async def decorated_awaits(n):
+        for _ in range(n):
+            await decorated()
+
+    bare = per_call_ns(bare_block, args.iterations)
+    timed_ns = per_call_ns(timed_block, args.iterations)
+    observe = per_call_ns(observe_only, args.iterations)
+    plain = asyncio.run(per_call_ns_async(plain_awaits, args.iterations))
+    wrapped = asyncio.run(per_call_ns_async(decorated_awaits, args.iterations))
+
+    print(f"{args.iterations} iterations, best of 5, OpenTelemetry spans {'on' if OTEL_ENABLED else 'off'}")
+    print(f"{'case':>28} {'ns/call':>9} {'overhead ns':>12}")
+    print(f"{'bare block':>28} {bare:>9.0f} {'':>12}")
+    print(f"{'timed() block':>28} {timed_ns:>9.0f} {timed_ns - bare:>12.0f}")
+    print(f"{'Histogram.observe()':>28} {observe:>9.0f} {observe - bare:>12.0f}")
+    print(f"{'await endpoint()':>28} {plain:>9.0f} {'':>12}")
+    print(f"{'await timed_async endpoint':>28} {wrapped:>9.0f} {wrapped - plain:>12.0f}")
+    # A generation passes through 6 timed stages; /api/history through one decorator
+    print(f"per generation (6 stages): {6 * (timed_ns - bare) / 1000:.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead of timed()/timed_async against bare blocks.")
+    parser.add_argument("--iterations", type=int, default=200_000)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
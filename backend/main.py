@@ -1,20 +1,42 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks # <-- Added HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response # <-- Added HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, FileResponse, RedirectResponse
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from sqlalchemy.future import select
+from sqlalchemy import tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import base64
 import time 
-import random 
-from app.database import Base, AsyncSessionLocal, get_db_async, Conversation
+from app.database import Conversation, get_db_replica, ReplicaSessionLocal
+from app.write_behind import ConversationWriter, conversation_row
+from app.cache import DesignCache
+from app.blob_store import create_blob_store, is_content_hash, LocalBlobStore
+from app.derivatives import DerivativeStore, CONTENT_TYPES, MIN_WIDTH, MAX_WIDTH
+from app.prompt_normalizer import normalize_prompt
+from app.semantic_cache import SemanticIndex, SEMANTIC_CACHE_ENABLED
+from app.governor import UpstreamGovernor, UpstreamUnavailable, ClientRateLimited
+from app.metrics import MetricsRegistry, timed, timed_async
+from app.jobs import (
+    JobWorkerPool, LocalJobQueue, RedisJobQueue, retry_with_backoff,
+    JOB_MAX_ATTEMPTS, FINISHED as FINISHED_JOB_STATES
+)
+from app.singleflight import (
+    SingleFlight, DISTRIBUTED_LOCK_ENABLED, acquire_lock, hold_lock, wait_for_peer,
+    PEER_DONE, PEER_FAILED, PEER_TIMEOUT
+)
 
 
 # --- NEW REDIS IMPORTS ---
-import redis
+# Async client so cache lookups never block the event loop
+import redis.asyncio as aioredis
 from redis.exceptions import ConnectionError
 import json
 import hashlib
+import math
 import os
 
 # --- NEW GEMINI IMPORTS ---
@@ -38,17 +60,38 @@ except (ValueError, Exception) as e:
     client = None
 
 
-try:
-    redis_client = redis.Redis(
-        host=os.getenv("REDIS_HOST", "localhost"),
-        port=int(os.getenv("REDIS_PORT", 6379)),
-        decode_responses=True
-    )
-    redis_client.ping()
-    print("Redis connection successful")
-except ConnectionError as e:
-    print(f"Error connecting to Redis: {e}")
-    redis_client = None
+# Async Redis client backed by a shared connection pool.
+# The connection is verified in the startup event (ping must be awaited).
+redis_pool = aioredis.ConnectionPool(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", 50)),
+    decode_responses=True
+)
+redis_client = aioredis.Redis(connection_pool=redis_pool)
+
+# Two-tier prompt cache: in-process LRU/TTL in front of Redis
+design_cache = DesignCache(redis_client)
+
+# Content-addressed store for generated image bytes (local disk or S3-compatible)
+blob_store = create_blob_store()
+# Thumbnails/previews, encoded in a process pool and kept in a bounded on-disk LRU
+derivative_store = DerivativeStore(blob_store)
+
+
+async def connect_redis():
+    """
+    Verifies the Redis connection once per worker. Caching is disabled
+    (redis_client = None) if the server cannot be reached.
+    """
+    global redis_client
+    try:
+        await redis_client.ping()
+        print("Redis connection successful")
+    except ConnectionError as e:
+        print(f"Error connecting to Redis: {e}")
+        redis_client = None
+        design_cache.redis = None  # Local tier keeps working on its own
 
 # --- NEW HELPER: Prompt Engineering Function ---
 # In backend/main.py, replace the existing engineer_prompt function:
@@ -92,53 +135,72 @@ def engineer_prompt(user_input: str) -> str:
 
 
 
-async def log_ai_response_in_background(
+# Batched write-behind logger shared by all requests in this worker
+conversation_writer = ConversationWriter()
+
+# --- METRICS (Prometheus /metrics + optional OpenTelemetry spans) ---
+metrics = MetricsRegistry()
+GENERATION_STAGE_SECONDS = metrics.histogram(
+    "generation_stage_seconds", "Time spent in each stage of the generation pipeline."
+)
+HISTORY_REQUEST_SECONDS = metrics.histogram(
+    "history_request_seconds", "Latency of /api/history requests."
+)
+CACHE_LOOKUPS = metrics.counter(
+    "generation_cache_lookups_total", "Prompt cache lookups by result (hit, near_duplicate_hit, stale_hit, miss)."
+)
+
+
+async def log_ai_response(
     ai_response_text: str, 
-    image_url: str, 
+    image_hash: str, 
     engineered_prompt: str, 
     is_cache_hit: bool
 ):
     """
-    Asynchronously handles the database logging. Executed by FastAPI 
-    in the background after the main HTTP response is sent.
+    Queues the AI response for the write-behind logger. The row is written
+    with the next batched INSERT; this only waits if the queue is full.
     """
-    async with AsyncSessionLocal() as db:
-        try:
-            if is_cache_hit:
-                response_text = f"(CACHED) {ai_response_text}"
-            else:
-                response_text = ai_response_text
-
-            ai_message_log = Conversation(
-                role='ai', 
-                prompt_text=response_text, 
-                generated_image_url=image_url, 
-                engineered_prompt=engineered_prompt
-            )
-            db.add(ai_message_log)
-            await db.commit()
-            print(f"Background Task Complete: Successfully logged AI response. Cache Hit: {is_cache_hit}")
-        except Exception as e:
-            # Crucial to catch errors in background tasks
-            print(f"Background Task Error: Failed to log AI response to DB: {e}")
+    if is_cache_hit:
+        response_text = f"(CACHED) {ai_response_text}"
+    else:
+        response_text = ai_response_text
 
+    await conversation_writer.submit(
+        role='ai', 
+        prompt_text=response_text, 
+        generated_image_url=image_hash, 
+        engineered_prompt=engineered_prompt
+    )
 
 
 
-# In backend/main.py (Find the create_tables function and replace it)
 
 app = FastAPI()
 
-async def create_tables(): # <-- FUNCTION IS NOW ASYNCHRONOUS
-    from app.database import engine, Base
-    # Use the async engine to run the table creation command
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-# Call the function once at startup using a standard event handler
+# Schema changes are applied by the migrations runner at deploy time
+# (python -m app.migrations), not on every worker boot.
 @app.on_event("startup")
 async def startup_event():
-    await create_tables()
+    await connect_redis()
+    await design_cache.start()
+    await derivative_store.start()
+    conversation_writer.start()
+    metrics.start()
+    # Jobs are shared across workers through Redis; without it each worker queues locally
+    global job_queue
+    job_queue = RedisJobQueue(redis_client) if redis_client else LocalJobQueue()
+    job_pool.start(job_queue)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_pool.stop()
+    # Drain queued conversation rows before the worker exits
+    await conversation_writer.stop()
+    await design_cache.stop()
+    await derivative_store.stop()
+    await metrics.stop()
+    await redis_pool.disconnect()
 
 
 # --- Pydantic Model ---
@@ -169,140 +231,844 @@ def read_root():
 def test_connection():
     return {"status": "Success", "data": "Backend is running and talking to FastAPI!"}
 
-from app.database import get_db_async
-# --- History Retrieval Endpoint ---
-@app.get("/api/history", response_model=List[dict])
-async def get_chat_history(db: AsyncSession = Depends(get_db_async)): # <-- Use async dependency
+# --- History Retrieval Endpoint (Keyset Pagination) ---
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+# How far behind its sync cursor an incremental fetch looks again. Must exceed the
+# write-behind delay (DB_WRITE_FLUSH_MS + DB_WRITE_ENQUEUE_TIMEOUT_S + flush time).
+HISTORY_SYNC_LAG_S = float(os.getenv("HISTORY_SYNC_LAG_S", 30))
+
+# Column-only select: rows come back as lightweight tuples, no ORM hydration
+HISTORY_COLUMNS = (
+    Conversation.id,
+    Conversation.role,
+    Conversation.prompt_text,
+    Conversation.generated_image_url,
+    Conversation.timestamp,
+)
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        ts, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid history cursor.")
+
+
+def history_row(row) -> dict:
+    return {
+        "id": row.id,
+        "role": row.role,
+        "text": row.prompt_text,
+        **image_urls_for(row.generated_image_url),
+        "timestamp": row.timestamp.isoformat(),
+    }
+
+
+@app.get("/api/history")
+@timed_async(HISTORY_REQUEST_SECONDS)
+async def get_chat_history(
+    limit: int = Query(HISTORY_DEFAULT_LIMIT, ge=1, le=HISTORY_MAX_LIMIT),
+    before: Optional[str] = None,   # Cursor from a previous page's next_cursor
+    since: Optional[str] = None,    # Cursor from a previous response's sync_cursor (incremental fetch)
+    db: AsyncSession = Depends(get_db_replica)
+):
+    """
+    Fetches one page of chat history, oldest-first within the page.
+
+    - Default / `before`: walks backwards from the newest message using a
+      (timestamp, id) keyset served by ix_conversations_timestamp_id, so every
+      page costs the same no matter how deep it is.
+    - `since`: returns messages after the client's sync cursor, plus every
+      message from the HISTORY_SYNC_LAG_S before it. Rows are timestamped when
+      queued but committed by batched flushes from several workers, so a row
+      can become visible after newer ones; the overlap catches those late
+      rows. Clients de-duplicate by id.
+    """
+    if since is not None:
+        return await fetch_history_since(db, since, limit)
+
+    query = select(*HISTORY_COLUMNS).order_by(Conversation.timestamp.desc(), Conversation.id.desc())
+    if before:
+        ts, row_id = decode_cursor(before)
+        query = query.where(tuple_(Conversation.timestamp, Conversation.id) < tuple_(ts, row_id))
+    # Fetch one extra row to know whether an older page exists
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Oldest row of this page is the cursor for the next (older) page
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None
+    # Newest row of the first page is where incremental fetches start
+    sync_cursor = encode_cursor(rows[0].timestamp, rows[0].id) if rows and not before else None
+    return {
+        "messages": [history_row(row) for row in reversed(rows)],
+        "next_cursor": next_cursor,
+        "sync_cursor": sync_cursor,
+        "has_more": has_more,
+    }
+
+
+async def fetch_history_since(db: AsyncSession, since: str, limit: int) -> dict:
+    ts, row_id = decode_cursor(since)
+    keyset = tuple_(Conversation.timestamp, Conversation.id)
+    # 1. Rows past the cursor, paged forwards: has_more means "call again with sync_cursor"
+    newer = (await db.execute(
+        select(*HISTORY_COLUMNS)
+        .where(keyset > tuple_(ts, row_id))
+        .order_by(Conversation.timestamp, Conversation.id)
+        .limit(limit + 1)
+    )).all()
+    has_more = len(newer) > limit
+    newer = newer[:limit]
+    # 2. The overlap window behind the cursor, re-sent so late commits are not skipped
+    overlap = (await db.execute(
+        select(*HISTORY_COLUMNS)
+        .where(Conversation.timestamp >= ts - timedelta(seconds=HISTORY_SYNC_LAG_S))
+        .where(keyset <= tuple_(ts, row_id))
+        .order_by(Conversation.timestamp, Conversation.id)
+        .limit(HISTORY_MAX_LIMIT)
+    )).all()
+
+    sync_cursor = encode_cursor(newer[-1].timestamp, newer[-1].id) if newer else since
+    return {
+        "messages": [history_row(row) for row in [*overlap, *newer]],
+        "next_cursor": None,
+        "sync_cursor": sync_cursor,
+        "has_more": has_more,
+    }
+
+
+# --- History Export Endpoint (Streaming) ---
+EXPORT_BATCH_SIZE = 1000
+
+
+async def stream_history_export(
+    export_format: str,
+    role: Optional[str],
+    start: Optional[datetime],
+    end: Optional[datetime],
+):
+    """
+    Yields the conversations table as NDJSON lines or a chunked JSON array.
+    Rows come off a server-side cursor in batches of EXPORT_BATCH_SIZE, so
+    memory stays flat regardless of table size.
+    """
+    query = select(*HISTORY_COLUMNS).order_by(Conversation.timestamp, Conversation.id)
+    if role:
+        query = query.where(Conversation.role == role)
+    if start:
+        query = query.where(Conversation.timestamp >= start)
+    if end:
+        query = query.where(Conversation.timestamp < end)
+    query = query.execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    # Own session: the request-scoped one may be closed before streaming finishes
+    async with ReplicaSessionLocal() as db:
+        result = await db.stream(query)
+        first = True
+        if export_format == "json":
+            yield "["
+        async for batch in result.partitions():
+            lines = [json.dumps(history_row(row), ensure_ascii=False) for row in batch]
+            if export_format == "json":
+                chunk = ",".join(lines)
+                yield chunk if first else "," + chunk
+            else:
+                yield "\n".join(lines) + "\n"
+            first = False
+        if export_format == "json":
+            yield "]"
+
+
+@app.get("/api/history/export")
+async def export_chat_history(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|json)$"),
+    role: Optional[str] = Query(None, pattern="^(user|ai)$"),
+    start: Optional[datetime] = None,   # Inclusive lower bound on timestamp
+    end: Optional[datetime] = None,     # Exclusive upper bound on timestamp
+):
+    """
+    Streams a full (optionally filtered) dump of the conversations table for analytics.
+    """
+    media_type = "application/json" if export_format == "json" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_history_export(export_format, role, start, end),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="conversations.{export_format}"'}
+    )
+
+# --- Image Endpoint (Content-Addressed Blobs) ---
+# A hash never changes content, so clients and CDNs may cache forever
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def image_urls_for(stored_value: Optional[str]) -> dict:
+    """
+    Maps what the DB/cache stores (a content hash) to the URLs clients load:
+    the full image plus small variants for list views. Older rows that still
+    hold a full URL are passed through unchanged.
+    """
+    if not is_content_hash(stored_value):
+        return {"image_url": stored_value, "thumbnail_url": None, "preview_url": None}
+    return {
+        "image_url": f"/api/images/{stored_value}",
+        "thumbnail_url": derivative_store.url(stored_value, "thumb"),
+        "preview_url": derivative_store.url(stored_value, "preview"),
+    }
+
+
+@app.get("/api/images/{image_hash}")
+async def get_image(image_hash: str, request: Request):
+    """
+    Serves a generated image by content hash with ETag / If-None-Match,
+    Range support and long-lived Cache-Control. Local blobs are sent with
+    FileResponse (sendfile/pathsend where the server supports it).
+    """
+    if not is_content_hash(image_hash):
+        raise HTTPException(status_code=404, detail="Image not found.")
+
+    etag = f'"{image_hash}"'
+    cache_headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    # The ETag is the hash itself, so a match needs no storage lookup at all
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in if_none_match or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=cache_headers)
+
+    if not isinstance(blob_store, LocalBlobStore):
+        return RedirectResponse(await blob_store.presigned_url(image_hash), status_code=302)
+
+    found = await blob_store.stat(image_hash)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    stat_result, content_type = found
+    return FileResponse(
+        blob_store.path(image_hash),
+        media_type=content_type,
+        headers=cache_headers,
+        stat_result=stat_result,
+    )
+
+
+@app.get("/api/images/{image_hash}/{width}.{fmt}")
+async def get_image_variant(image_hash: str, width: int, fmt: str, request: Request):
+    """
+    Serves a resized/re-encoded copy of a generated image (e.g. 160.webp).
+    Standard sizes are precomputed; any other width is rendered on first use.
+    """
+    if not is_content_hash(image_hash) or fmt not in derivative_store.formats:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    if not MIN_WIDTH <= width <= MAX_WIDTH:
+        raise HTTPException(status_code=400, detail=f"Width must be between {MIN_WIDTH} and {MAX_WIDTH}.")
+
+    etag = f'"{image_hash}-{width}.{fmt}"'
+    cache_headers = {"ETag": etag, "Cache-Control": IMAGE_CACHE_CONTROL}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=cache_headers)
+
+    path = await derivative_store.get(image_hash, width, fmt)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    return FileResponse(path, media_type=CONTENT_TYPES[fmt], headers=cache_headers)
+
+# --- GENERATION PIPELINE (Gemini Call + Cache Write) ---
+# Identical concurrent prompts share one upstream call per worker
+generation_flight = SingleFlight()
+# Bounds and adapts upstream load; fails fast while Gemini is unhealthy
+governor = UpstreamGovernor(
+    is_throttle=lambda e: isinstance(e, APIError) and e.code == 429,
+    is_server_error=lambda e: isinstance(e, APIError) and (e.code or 0) >= 500
+)
+# Optional near-duplicate lookup over prompts this worker has seen
+semantic_index = SemanticIndex()
+
+
+async def call_gemini(prompt: str, engineered_prompt: str, cache_key: str) -> dict:
+    """
+    Runs the Imagen call and stores the result in Redis. Only ever executed
+    by the single-flight leader for a given cache key.
     """
-    Fetches the entire chat history from the database asynchronously.
+    return (await call_gemini_variants(prompt, engineered_prompt, [cache_key]))[0]
+
+
+async def call_gemini_variants(prompt: str, engineered_prompt: str, cache_keys: List[str]) -> List[dict]:
     """
-    # Use async ORM commands
-    result = await db.execute(select(Conversation).order_by(Conversation.timestamp))
-    history = result.scalars().all()
+    One Imagen call producing len(cache_keys) images; each image is stored and
+    cached under its own key. Imagen may return fewer images than requested
+    (e.g. safety filtering), so the result can be shorter than cache_keys.
+    """
+    print(f"CACHE MISS: Calling Gemini with prompt: {engineered_prompt}")
+
+    # Gemini API call (takes several seconds) - async client keeps the event loop free
+    # Routed through the governor: breaker, global rate limit, adaptive concurrency, timeout
+    with timed(GENERATION_STAGE_SECONDS, stage="gemini_call"):
+        gemini_response = await governor.call(lambda: client.aio.models.generate_images(
+            model='imagen-4.0-generate-001', 
+            prompt=engineered_prompt,
+            config=dict(
+                number_of_images=len(cache_keys),
+                aspect_ratio='1:1'
+            )
+        ))
     
-    # ... (return formatting remains the same) ...
-    return [
-        {
-            "id": msg.id,
-            "role": msg.role,
-            "text": msg.prompt_text,
-            "image_url": msg.generated_image_url,
-            "timestamp": msg.timestamp.isoformat(), 
-        }
-        for msg in history
-    ]
+    if not gemini_response.generated_images:
+        # google-genai's APIError takes (code, response_json), like the errors the SDK raises itself
+        raise APIError(500, {"error": {
+            "code": 500, "status": "INTERNAL", "message": "Gemini generated no images for the prompt."
+        }})
+        
+    # Persist the image bytes; the cache and DB only ever hold the content hash
+    images = [generated.image for generated in gemini_response.generated_images[:len(cache_keys)]]
+    with timed(GENERATION_STAGE_SECONDS, stage="image_store"):
+        image_hashes = await asyncio.gather(*(blob_store.put(image.image_bytes, image.mime_type) for image in images))
+    # Thumbnail/preview variants are encoded in the background, off the event loop
+    for image_hash, image in zip(image_hashes, images):
+        derivative_store.precompute(image_hash, image.image_bytes)
+    ai_response_text = f"Analyzing your request for '{prompt}'... Here is your high-resolution AI-designed tattoo concept!"
+    designs = [{"ai_text": ai_response_text, "image_hash": image_hash} for image_hash in image_hashes]
+
+    # Cache Write (local tier + Redis for 24 hours) - Must be done BEFORE response is sent
+    with timed(GENERATION_STAGE_SECONDS, stage="cache_write"):
+        await asyncio.gather(*(design_cache.set(key, design) for key, design in zip(cache_keys, designs)))
+    print("CACHE WRITE: Stored successful response in cache.")
+
+    return designs
+
+
+async def generate_design(prompt: str, engineered_prompt: str, cache_key: str) -> dict:
+    """
+    Single-flight leader body. With SINGLEFLIGHT_REDIS_LOCK enabled, also
+    coalesces across uvicorn workers: only the Redis lock holder calls Gemini,
+    the other workers wait for its result to land in the cache.
+    """
+    if not (DISTRIBUTED_LOCK_ENABLED and redis_client):
+        return await call_gemini(prompt, engineered_prompt, cache_key)
+
+    lock_token = await acquire_lock(redis_client, cache_key)
+    if lock_token is None:
+        generation_flight.stats["lock_waits"] += 1
+        outcome, value = await wait_for_peer(redis_client, cache_key)
+        if outcome == PEER_DONE:
+            generation_flight.stats["lock_wait_hits"] += 1
+            return {"ai_text": value['ai_text'], "image_hash": value['image_hash']}
+        if outcome == PEER_FAILED:
+            # Share the holder's failure like in-process followers do, instead of every worker retrying at once
+            generation_flight.stats["lock_peer_failures"] += 1
+            raise UpstreamUnavailable("AI generation failed on another worker.", retry_after=1.0)
+        if outcome == PEER_TIMEOUT:
+            generation_flight.stats["lock_timeouts"] += 1
+            # Holder is alive but past its whole upstream budget - generate ourselves (without the lock)
+            return await call_gemini(prompt, engineered_prompt, cache_key)
+        # PEER_EXPIRED: the holder died; we won the lock and take over
+        generation_flight.stats["lock_takeovers"] += 1
+        lock_token = value
+
+    async with hold_lock(redis_client, cache_key, lock_token):
+        return await call_gemini(prompt, engineered_prompt, cache_key)
+
+
 # --- UNIFIED IMAGE GENERATION ENDPOINT ---
 # In backend/main.py, modify the generate_tattoo endpoint:
 
 # In backend/main.py, replace the entire generate_tattoo function:
 # In backend/main.py, replace the entire generate_tattoo function:
 
-@app.post("/api/generate_tattoo")
-async def generate_tattoo(
-    request: PromptRequest,     
-    background_tasks: BackgroundTasks, # <-- Accepts background task handler
-    db: AsyncSession = Depends(get_db_async)
-):
+def client_id_for(http_request: Request) -> Optional[str]:
+    # Per-client quotas key on the caller's address (or CLIENT_ID_HEADER behind a load balancer)
+    return governor.client_key(http_request.headers, http_request.client.host if http_request.client else None)
+
+
+def cache_key_for(prompt: str) -> tuple:
+    """
+    Returns (normalized prompt, cache key). Keyed on the normalized prompt so
+    "Lion on chest" and "lion on my chest " share a design.
+    """
+    normalized_prompt = normalize_prompt(prompt)
+    return normalized_prompt, hashlib.sha256(engineer_prompt(normalized_prompt).encode('utf-8')).hexdigest()
+
+
+async def run_generation(prompt: str, max_attempts: int = 1, on_retry=None, client_id: Optional[str] = None) -> dict:
+    """
+    The full generation pipeline shared by the synchronous endpoint and the
+    job workers. With max_attempts > 1, the Gemini call is retried with
+    exponential backoff on APIError. When the governor refuses the call,
+    a stale cached design is served if one exists.
+    """
     # 1. Check for AI Service Initialization
     if not client:
         raise HTTPException(status_code=500, detail="AI Service Initialization Error. GEMINI_API_KEY is missing.")
         
-    prompt = request.user_prompt
-    engineered_prompt = engineer_prompt(prompt)
+    with timed(GENERATION_STAGE_SECONDS, stage="prompt_engineering"):
+        engineered_prompt = engineer_prompt(prompt)
+        normalized_prompt, cache_key = cache_key_for(prompt)
+    
+    # --- 2. CACHE CHECK (Local LRU -> Redis -> Near-Duplicate Index) ---
+    with timed(GENERATION_STAGE_SECONDS, stage="cache_lookup"):
+        cached_data = await design_cache.get(cache_key)
+        cache_result = "hit" if cached_data else "miss"
+
+        if cached_data and SEMANTIC_CACHE_ENABLED:
+            semantic_index.add(cache_key, normalized_prompt)
+        elif SEMANTIC_CACHE_ENABLED:
+            match = semantic_index.nearest(normalized_prompt)
+            if match:
+                cached_data = await design_cache.get(match[0])
+                if cached_data:
+                    cache_result = "near_duplicate_hit"
+                    print(f"CACHE HIT (near-duplicate, similarity {match[1]:.2f}).")
+                else:
+                    semantic_index.remove(match[0])  # Cached design expired
+    CACHE_LOOKUPS.inc(result=cache_result)
     
-    # --- 2. CACHE CHECK (Redis) ---
-    cache_key = None
-    if redis_client:
-        cache_key = hashlib.sha256(engineered_prompt.encode('utf-8')).hexdigest()
-        cached_data = redis_client.hgetall(cache_key)
+    if cached_data:
+        print("CACHE HIT: Serving cached response.")
         
-        if cached_data and 'image_url' in cached_data:
-            print("CACHE HIT: Serving response from Redis.")
-            
-            # Log the CACHE HIT in the BACKGROUND
-            background_tasks.add_task(
-                log_ai_response_in_background,
-                ai_response_text=cached_data['ai_text'],
-                image_url=cached_data['image_url'],
-                engineered_prompt=engineered_prompt,
-                is_cache_hit=True
-            )
-            
-            # Return INSTANTLY
-            return {
-                "status": "success",
-                "ai_text": cached_data['ai_text'],
-                "image_url": cached_data['image_url'],
-                "engineered_prompt": engineered_prompt
-            }
+        # Log the CACHE HIT via the write-behind queue (no DB round trip here)
+        await log_ai_response(
+            ai_response_text=cached_data['ai_text'],
+            image_hash=cached_data['image_hash'],
+            engineered_prompt=engineered_prompt,
+            is_cache_hit=True
+        )
+        
+        # Return INSTANTLY
+        return {
+            "status": "success",
+            "ai_text": cached_data['ai_text'],
+            **image_urls_for(cached_data['image_hash']),
+            "engineered_prompt": engineered_prompt,
+            "stale": False
+        }
     
-    # --- 3. CACHE MISS: LOG USER MESSAGE (Synchronous Write) ---
-    # Must be synchronous so the user's message appears in history before AI response
-    user_message = Conversation(
-        role='user', 
-        prompt_text=prompt, 
-        generated_image_url=None, 
-        engineered_prompt=None
-    )
-    db.add(user_message)
-    await db.commit() 
-    await db.refresh(user_message)
+    # --- 3. CACHE MISS: LOG USER MESSAGE (Batched Write) ---
+    # The queue is FIFO and rows are timestamped on submit, so the user's message
+    # still lands in history before the AI response
+    with timed(GENERATION_STAGE_SECONDS, stage="user_message_insert"):
+        await conversation_writer.submit(
+            role='user', 
+            prompt_text=prompt, 
+            generated_image_url=None, 
+            engineered_prompt=None
+        )
     
-    # --- 4. CACHE MISS: GEMINI API CALL (High Latency Operation) ---
+    # --- 4. CACHE MISS: GEMINI API CALL (Coalesced per cache key) ---
+    served_stale = False
     try:
-        print(f"CACHE MISS: Calling Gemini with prompt: {engineered_prompt}")
+        # Quota is charged only if this request ends up making the upstream call
+        design = await retry_with_backoff(
+            lambda: generation_flight.do(
+                cache_key,
+                lambda: generate_design(prompt, engineered_prompt, cache_key),
+                on_lead=(lambda: governor.check_client(client_id)) if client_id else None
+            ),
+            retry_on=(APIError, UpstreamUnavailable),
+            max_attempts=max_attempts,
+            on_retry=on_retry
+        )
+        ai_response_text = design['ai_text']
+        image_hash = design['image_hash']
+        if SEMANTIC_CACHE_ENABLED:
+            semantic_index.add(cache_key, normalized_prompt)
 
-        # Gemini API call (takes several seconds)
-        gemini_response = client.models.generate_images(
-            model='imagen-4.0-generate-001', 
-            prompt=engineered_prompt,
-            config=dict(
-                number_of_images=1,
-                aspect_ratio='1:1'
+    except UpstreamUnavailable as e:
+        # Breaker open / overloaded / quota exceeded: fall back to a stale design
+        design = await design_cache.get_stale(cache_key)
+        if not design:
+            await conversation_writer.submit(
+                role='ai', 
+                prompt_text=f"🚨 AI Service Unavailable: {e}", 
+                generated_image_url=None, 
+                engineered_prompt=engineered_prompt
             )
-        )
-        
-        if not gemini_response.generated_images:
-            raise APIError("Gemini generated no images for the prompt.")
-            
-        # Using placeholder URL for successful generation (replace with actual image upload logic later)
-        image_url = 'https://picsum.photos/400/400?random=' + str(random.randint(1, 100))
-        ai_response_text = f"Analyzing your request for '{prompt}'... Here is your high-resolution AI-designed tattoo concept!"
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=f"AI Generation Unavailable: {e}",
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
+        print(f"STALE CACHE: Serving stale design ({e}).")
+        CACHE_LOOKUPS.inc(result="stale_hit")
+        served_stale = True
+        ai_response_text = design['ai_text']
+        image_hash = design['image_hash']
 
     except APIError as e:
-        # Log failure synchronously before raising the exception
-        ai_message_fail = Conversation(
+        # Queue the failure log before raising the exception
+        await conversation_writer.submit(
             role='ai', 
             prompt_text=f"🚨 Gemini API Failed: {e}", 
             generated_image_url=None, 
             engineered_prompt=engineered_prompt
         )
-        db.add(ai_message_fail)
-        await db.commit()
         raise HTTPException(status_code=500, detail=f"AI Generation Failed: {e}")
 
-    # --- 5. CACHE WRITE & DB LOGGING (Background Tasks) ---
-    
-    # Redis Write (Store the result for 24 hours) - Must be done BEFORE response is sent
-    if redis_client and cache_key:
-        cache_data = {"ai_text": ai_response_text, "image_url": image_url,}
-        redis_client.hset(cache_key, mapping=cache_data)
-        redis_client.expire(cache_key, 60 * 60 * 24)
-        print("CACHE WRITE: Stored successful response in Redis.")
-
-    # Log successful AI response in the BACKGROUND
-    background_tasks.add_task(
-        log_ai_response_in_background,
+    # --- 5. DB LOGGING (Write-Behind Queue) ---
+    await log_ai_response(
         ai_response_text=ai_response_text,
-        image_url=image_url,
+        image_hash=image_hash,
         engineered_prompt=engineered_prompt,
-        is_cache_hit=False
+        is_cache_hit=served_stale
     )
     
     # --- 6. Return Final Response (Instantaneous) ---
     return {
         "status": "success",
         "ai_text": ai_response_text,
-        "image_url": image_url,
-        "engineered_prompt": engineered_prompt
-    }
\ No newline at end of file
+        **image_urls_for(image_hash),
+        "engineered_prompt": engineered_prompt,
+        "stale": served_stale
+    }
+
+
+@app.post("/api/generate_tattoo")
+async def generate_tattoo(request: PromptRequest, http_request: Request):
+    """
+    Synchronous mode: holds the connection until the design is ready.
+    For long generations prefer POST /api/jobs.
+    """
+    return await run_generation(request.user_prompt, client_id=client_id_for(http_request))
+
+
+# --- BATCH GENERATION (Many Prompts x Variants, Streamed) ---
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", 50))
+BATCH_MAX_VARIANTS = 4  # Imagen returns at most 4 images per call
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))  # Upstream calls in flight per batch request
+
+class BatchPromptRequest(BaseModel):
+    user_prompts: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_PROMPTS)
+    variants: int = Field(1, ge=1, le=BATCH_MAX_VARIANTS)
+
+
+def variant_keys(cache_key: str, variants: int) -> List[str]:
+    # Variant 0 shares the single-prompt cache entry; extra variants get their own keys
+    return [cache_key] + [f"{cache_key}:v{n}" for n in range(1, variants)]
+
+
+def batch_result(index: int, variant: int, design: dict, engineered_prompt: str, cached: bool, stale: bool = False) -> dict:
+    return {
+        "index": index,
+        "variant": variant,
+        "status": "success",
+        "ai_text": design['ai_text'],
+        **image_urls_for(design['image_hash']),
+        "engineered_prompt": engineered_prompt,
+        "cached": cached,
+        "stale": stale
+    }
+
+
+def batch_error(index: int, variant: int, status_code: int, detail: str) -> dict:
+    return {"index": index, "variant": variant, "status": "error", "status_code": status_code, "detail": detail}
+
+
+async def generate_batch_misses(
+    index: int, prompt: str, engineered_prompt: str, keys: List[str], missing: List[int],
+    semaphore: asyncio.Semaphore, rows: List[dict]
+) -> List[dict]:
+    """
+    Generates the missing variants of one batch prompt with a single Imagen
+    call. Failures become per-variant error results instead of failing the
+    whole batch; conversation rows are appended to `rows`.
+    """
+    missing_keys = [keys[variant] for variant in missing]
+    async with semaphore:
+        try:
+            # The batch was charged per upstream call at admission (see generate_tattoo_batch)
+            if missing_keys == [keys[0]]:
+                # Plain single-variant miss: coalesces with /api/generate_tattoo for the same prompt
+                designs = [await generation_flight.do(
+                    keys[0], lambda: generate_design(prompt, engineered_prompt, keys[0])
+                )]
+            else:
+                designs = await generation_flight.do(
+                    "|".join(missing_keys), lambda: call_gemini_variants(prompt, engineered_prompt, missing_keys)
+                )
+        except UpstreamUnavailable as e:
+            stale_designs = await asyncio.gather(*(design_cache.get_stale(key) for key in missing_keys))
+            results = []
+            for variant, design in zip(missing, stale_designs):
+                if design:
+                    CACHE_LOOKUPS.inc(result="stale_hit")
+                    rows.append(conversation_row('ai', f"(CACHED) {design['ai_text']}", design['image_hash'], engineered_prompt))
+                    results.append(batch_result(index, variant, design, engineered_prompt, cached=True, stale=True))
+                else:
+                    results.append(batch_error(index, variant, e.status_code, f"AI Generation Unavailable: {e}"))
+            if any(result["status"] == "error" for result in results):
+                rows.append(conversation_row('ai', f"🚨 AI Service Unavailable: {e}", None, engineered_prompt))
+            return results
+        except APIError as e:
+            rows.append(conversation_row('ai', f"🚨 Gemini API Failed: {e}", None, engineered_prompt))
+            return [batch_error(index, variant, 500, f"AI Generation Failed: {e}") for variant in missing]
+        except Exception as e:
+            # Redis, blob store, etc. - fail this prompt only, never the whole stream
+            print(f"Batch Error: prompt {index} failed: {e!r}")
+            rows.append(conversation_row('ai', f"🚨 AI Generation Failed: {e}", None, engineered_prompt))
+            return [batch_error(index, variant, 500, "AI Generation Failed: internal error.") for variant in missing]
+
+    results = []
+    for position, variant in enumerate(missing):
+        if position >= len(designs):
+            results.append(batch_error(index, variant, 500, "AI Generation Failed: Gemini returned fewer images than requested."))
+            continue
+        design = designs[position]
+        rows.append(conversation_row('ai', design['ai_text'], design['image_hash'], engineered_prompt))
+        results.append(batch_result(index, variant, design, engineered_prompt, cached=False))
+    return results
+
+
+async def prepare_batch(prompts: List[str], variants: int) -> tuple:
+    """
+    Engineers every prompt and resolves all of its variant keys in one
+    pipelined cache lookup. Returns (prepared, cached); the endpoint uses it
+    to price the batch before anything is streamed.
+    """
+    with timed(GENERATION_STAGE_SECONDS, stage="prompt_engineering"):
+        prepared = []
+        for index, prompt in enumerate(prompts):
+            normalized_prompt, cache_key = cache_key_for(prompt)
+            prepared.append((index, prompt, engineer_prompt(prompt), normalized_prompt, variant_keys(cache_key, variants)))
+    with timed(GENERATION_STAGE_SECONDS, stage="cache_lookup"):
+        try:
+            cached = await design_cache.get_many([key for *_, keys in prepared for key in keys])
+        except Exception as e:
+            print(f"Batch Error: cache lookup failed, treating all as misses: {e!r}")
+            cached = {}
+    return prepared, cached
+
+
+def batch_upstream_calls(prepared: list, cached: dict) -> int:
+    # One Imagen call per prompt with at least one uncached variant
+    return sum(1 for *_, keys in prepared if any(key not in cached for key in keys))
+
+
+async def stream_batch(prepared: list, cached: dict):
+    """
+    Yields one NDJSON line per (prompt, variant). Cache hits go out first; misses
+    are generated concurrently (BATCH_CONCURRENCY at a time) and streamed as each
+    prompt completes. All conversation rows are queued together at the end.
+    """
+    rows: List[dict] = []
+    tasks: List[asyncio.Task] = []
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    try:
+        # 1. Fan out the misses before writing anything, so generation starts right away
+        hits = []
+        for index, prompt, engineered_prompt, normalized_prompt, keys in prepared:
+            missing = [variant for variant, key in enumerate(keys) if key not in cached]
+            for variant, key in enumerate(keys):
+                CACHE_LOOKUPS.inc(result="miss" if variant in missing else "hit")
+                if variant not in missing:
+                    design = cached[key]
+                    rows.append(conversation_row('ai', f"(CACHED) {design['ai_text']}", design['image_hash'], engineered_prompt))
+                    hits.append(batch_result(index, variant, design, engineered_prompt, cached=True))
+            if SEMANTIC_CACHE_ENABLED:
+                semantic_index.add(keys[0], normalized_prompt)
+            if missing:
+                rows.append(conversation_row('user', prompt))
+                tasks.append(asyncio.create_task(generate_batch_misses(
+                    index, prompt, engineered_prompt, keys, missing, semaphore, rows
+                )))
+
+        # 2. Stream hits immediately, then each prompt's variants as they finish
+        for result in hits:
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        for next_done in asyncio.as_completed(tasks):
+            for result in await next_done:
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+    finally:
+        # Client gone or batch done: stop waiting (in-flight Gemini calls still finish
+        # and land in the cache, single-flight shields them) and log what we have
+        for task in tasks:
+            task.cancel()
+        conversation_writer.submit_many(rows)
+
+
+@app.post("/api/generate_tattoo/batch")
+async def generate_tattoo_batch(request: BatchPromptRequest, http_request: Request):
+    """
+    Generates `variants` designs for each prompt and streams results as NDJSON,
+    one line per (index, variant) in completion order. A failed prompt yields
+    error lines for its variants; the rest of the batch still completes.
+
+    Cache hits are free. Every prompt that still needs an Imagen call costs one
+    unit of the caller's quota (GOVERNOR_CLIENT_*), charged up front and all at
+    once, so a batch never buys more upstream calls than the equivalent single
+    requests would. Batches needing more calls than GOVERNOR_CLIENT_BURST are
+    rejected outright - split them.
+    """
+    if not client:
+        raise HTTPException(status_code=500, detail="AI Service Initialization Error. GEMINI_API_KEY is missing.")
+    prepared, cached = await prepare_batch(request.user_prompts, request.variants)
+    cost = batch_upstream_calls(prepared, cached)
+    client_id = client_id_for(http_request)
+    if client_id and cost:
+        if cost > governor.client_burst():
+            raise HTTPException(
+                status_code=429,
+                detail=f"Batch needs {cost} generations; at most {governor.client_burst()} uncached prompts are allowed per batch."
+            )
+        try:
+            governor.check_client(client_id, cost)
+        except ClientRateLimited as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    return StreamingResponse(
+        stream_batch(prepared, cached),
+        media_type="application/x-ndjson"
+    )
+
+
+# --- ASYNC JOB MODE (Queue + Polling / SSE) ---
+class JobRequest(PromptRequest):
+    priority: int = Field(0, ge=0, le=9)  # Higher runs first
+
+JOB_EVENTS_POLL_S = 0.5
+JOB_EVENTS_HEARTBEAT_S = 15
+
+
+async def run_generation_job(job: dict, on_retry) -> dict:
+    return await run_generation(job["prompt"], max_attempts=JOB_MAX_ATTEMPTS, on_retry=on_retry)
+
+# Bounded pool draining the job queue (queue backend is picked at startup)
+job_pool = JobWorkerPool(handler=run_generation_job)
+job_queue = None
+
+
+def job_view(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"],
+    }
+
+
+@app.post("/api/jobs", status_code=202)
+async def create_generation_job(request: JobRequest, http_request: Request):
+    """
+    Queues a generation and returns its job id immediately. Identical prompts
+    that are still pending share one job. Only submissions that create a new
+    job count against the caller's generation quota.
+    """
+    if not client:
+        raise HTTPException(status_code=500, detail="AI Service Initialization Error. GEMINI_API_KEY is missing.")
+    client_id = client_id_for(http_request)
+    _, cache_key = cache_key_for(request.user_prompt)
+    try:
+        job, deduplicated = await job_queue.enqueue(
+            request.user_prompt, request.priority, cache_key,
+            admit=(lambda: governor.check_client(client_id)) if client_id else None
+        )
+    except ClientRateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    return {**job_view(job), "deduplicated": deduplicated}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_generation_job(job_id: str):
+    """
+    Polling endpoint for job status and, once done, the result.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job_view(job)
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_generation_job(job_id: str):
+    """
+    Server-Sent Events: one `status` event per state change, ending with the
+    final `done` or `failed` event.
+    """
+    if await job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        last_sent, last_beat = None, loop.time()
+        while True:
+            job = await job_queue.get(job_id)
+            if job is None:
+                yield "event: failed\ndata: {\"error\": \"Job expired.\"}\n\n"
+                return
+            view = job_view(job)
+            if view != last_sent:
+                event = job["status"] if job["status"] in FINISHED_JOB_STATES else "status"
+                yield f"event: {event}\ndata: {json.dumps(view)}\n\n"
+                last_sent = view
+                if job["status"] in FINISHED_JOB_STATES:
+                    return
+            elif loop.time() - last_beat > JOB_EVENTS_HEARTBEAT_S:
+                yield ": keep-alive\n\n"
+                last_beat = loop.time()
+            await asyncio.sleep(JOB_EVENTS_POLL_S)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# --- METRICS ENDPOINT ---
+def cache_hit_ratio() -> dict:
+    lookups = {dict(labels)["result"]: value for labels, value in CACHE_LOOKUPS.values().items()}
+    total = sum(lookups.values())
+    hits = total - lookups.get("miss", 0)
+    return {(): hits / total if total else 0.0}
+
+
+def cache_tier_stats() -> dict:
+    snapshot = design_cache.snapshot()
+    values = {(("tier", "local"), ("stat", stat)): value for stat, value in snapshot["local"].items()}
+    values.update({(("tier", "redis"), ("stat", stat)): value for stat, value in snapshot["redis"].items()})
+    return values
+
+
+def db_pool_stats() -> dict:
+    from app.database import engine, replica_engine
+    engines = {"primary": engine} if replica_engine is engine else {"primary": engine, "replica": replica_engine}
+    values = {}
+    for name, db_engine in engines.items():
+        pool = db_engine.sync_engine.pool
+        for stat in ("size", "checkedout", "overflow", "checkedin"):
+            reader = getattr(pool, stat, None)
+            if reader is not None:
+                values[(("engine", name), ("stat", stat))] = reader()
+    return values
+
+
+def labelled(stats: dict) -> dict:
+    # Numeric entries of a component's stats dict as {(("stat", name),): value}
+    return {(("stat", k),): v for k, v in stats.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+
+
+metrics.collector("generation_cache_hit_ratio", "gauge", "Share of prompt lookups served from cache.", cache_hit_ratio)
+metrics.collector("design_cache_stats", "gauge", "Two-tier prompt cache counters and size, per tier.", cache_tier_stats)
+metrics.collector("db_pool_connections", "gauge", "SQLAlchemy connection pool utilization.", db_pool_stats)
+metrics.collector("write_behind_queue_depth", "gauge", "Conversation rows waiting to be flushed.",
+                  lambda: {(): conversation_writer.depth()})
+metrics.collector("write_behind_stats", "gauge", "Write-behind logger counters and flush latency (ms).",
+                  lambda: labelled(conversation_writer.stats))
+metrics.collector("singleflight_stats", "gauge", "Generation coalescing counters.",
+                  lambda: {**labelled(generation_flight.stats), (("stat", "in_flight"),): generation_flight.in_flight()})
+metrics.collector("upstream_governor_stats", "gauge", "Gemini governor counters, concurrency limit and breaker (1 = open).",
+                  lambda: {**labelled(governor.snapshot()),
+                           (("stat", "breaker_open"),): int(governor.breaker.state != "closed")})
+metrics.collector("job_pool_stats", "gauge", "Async generation job counters.", lambda: labelled(job_pool.stats))
+metrics.collector("derivative_stats", "gauge", "Thumbnail/preview encoder counters.",
+                  lambda: labelled(derivative_store.stats))
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus text exposition of this worker's metrics. Scrape every worker
+    (or run one worker per pod) - values are per process.
+    """
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
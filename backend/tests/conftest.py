@@ -0,0 +1,89 @@
+# Shared fixtures for the backend tests. Run from backend/:
+#   pip install -r requirements-dev.txt && python -m pytest -q
+
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# --- 1. Test Environment (must be set before main is imported) ---
+_TMP = tempfile.mkdtemp(prefix="tattoo-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_TMP}/test.sqlite")
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("BLOB_STORE_DIR", os.path.join(_TMP, "blobs"))
+os.environ.setdefault("DERIVATIVE_DIR", os.path.join(_TMP, "derivatives"))
+# Quotas high enough that rate limiting never masks what a test is measuring
+os.environ.setdefault("GOVERNOR_CLIENT_RATE", "1000")
+os.environ.setdefault("GOVERNOR_CLIENT_BURST", "1000")
+os.environ.setdefault("GOVERNOR_GLOBAL_RATE", "1000")
+os.environ.setdefault("GOVERNOR_GLOBAL_BURST", "1000")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# --- 2. Stub Imagen Client ---
+class StubModels:
+    """
+    Stands in for client.aio.models: counts calls and returns one fake
+    image per requested variant after `delay` seconds.
+    """
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_images(self, model, prompt, config):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        images = [
+            SimpleNamespace(image=SimpleNamespace(
+                image_bytes=b"\x89PNG\r\n\x1a\n" + f"{prompt}:{n}".encode(), mime_type="image/png"
+            ))
+            for n in range(config.get("number_of_images", 1))
+        ]
+        return SimpleNamespace(generated_images=images)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """
+    main with a stub Imagen client, fakeredis, and fresh per-test copies of
+    the components that hold asyncio primitives (each test runs its own loop).
+    """
+    import fakeredis
+    import main
+    from app.cache import DesignCache
+    from app.governor import UpstreamGovernor
+    from app.singleflight import SingleFlight
+    from app.write_behind import ConversationWriter
+
+    stub = StubModels()
+    fake_redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(main, "client", SimpleNamespace(aio=SimpleNamespace(models=stub)))
+    monkeypatch.setattr(main, "redis_client", fake_redis)
+    monkeypatch.setattr(main, "design_cache", DesignCache(fake_redis))
+    monkeypatch.setattr(main, "generation_flight", SingleFlight())
+    monkeypatch.setattr(main, "conversation_writer", ConversationWriter())
+    monkeypatch.setattr(main, "governor", UpstreamGovernor(main.governor.is_throttle, main.governor.is_server_error))
+    monkeypatch.setattr(main.derivative_store, "precompute", lambda image_hash, data: None)
+    return SimpleNamespace(main=main, stub=stub, redis=fake_redis)
+
+
+@pytest.fixture
+def db():
+    """
+    Migrated test database with an empty conversations table. Yields the
+    path of the SQLite file for tests that seed rows directly.
+    """
+    import sqlite3
+    from app.database import engine
+    from app.migrations import run_migrations
+
+    asyncio.run(run_migrations())
+    with sqlite3.connect(engine.url.database) as conn:
+        conn.execute("DELETE FROM conversations")
+    yield engine.url.database
+    asyncio.run(engine.dispose())
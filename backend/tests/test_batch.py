@@ -0,0 +1,81 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+
+from app import governor as governor_module
+
+
+def post(app, path: str, body: dict):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json=body)
+
+    return asyncio.run(scenario())
+
+
+def post_batch(app, body: dict):
+    response = post(app, "/api/generate_tattoo/batch", body)
+    return response.status_code, [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_batch_cannot_buy_more_upstream_calls_than_the_client_burst(app, monkeypatch):
+    monkeypatch.setattr(governor_module, "CLIENT_BURST", 5)
+    monkeypatch.setattr(governor_module, "CLIENT_RATE_PER_S", 0.001)
+
+    # 50 uncached prompts need 50 Imagen calls: more than the burst, rejected before any call
+    status, _ = post_batch(app, {"user_prompts": [f"oversized batch {n}" for n in range(50)], "variants": 4})
+    assert status == 429 and app.stub.calls == 0
+
+    # 5 prompts x 4 variants = 5 calls: exactly the burst
+    prompts = [f"burst batch {n}" for n in range(5)]
+    status, lines = post_batch(app, {"user_prompts": prompts, "variants": 4})
+    assert status == 200 and app.stub.calls == 5
+    assert len(lines) == 20 and all(line["status"] == "success" for line in lines)
+
+    # The batch spent the quota, so the next uncached request is refused
+    response = post(app, "/api/generate_tattoo", {"user_prompt": "one more prompt"})
+    assert response.status_code == 429 and app.stub.calls == 5
+
+    # Fully cached batches cost nothing
+    status, lines = post_batch(app, {"user_prompts": prompts, "variants": 4})
+    assert status == 200 and all(line["cached"] for line in lines)
+    assert app.stub.calls == 5
+
+
+def test_batch_at_default_client_quota(app, monkeypatch):
+    monkeypatch.setattr(governor_module, "CLIENT_BURST", 5)
+    monkeypatch.setattr(governor_module, "CLIENT_RATE_PER_S", 0.2)
+    prompts = [f"batch quota prompt {n}" for n in range(5)]
+
+    status, lines = post_batch(app, {"user_prompts": prompts, "variants": 2})
+
+    assert status == 200
+    assert len(lines) == 10 and all(line["status"] == "success" for line in lines)
+    assert {(line["index"], line["variant"]) for line in lines} == {(i, v) for i in range(5) for v in range(2)}
+    assert app.stub.calls == 5
+
+
+def test_failing_prompts_do_not_abort_the_stream(app):
+    generate_images = app.stub.generate_images
+
+    async def flaky_generate_images(model, prompt, config):
+        if "empty" in prompt:
+            app.stub.calls += 1
+            return SimpleNamespace(generated_images=[])  # e.g. everything safety-filtered
+        if "broken" in prompt:
+            raise RuntimeError("blob store unavailable")
+        return await generate_images(model, prompt, config)
+
+    app.stub.generate_images = flaky_generate_images
+    prompts = ["batch ok lion", "batch empty eagle", "batch broken wolf", "batch ok rose"]
+
+    status, lines = post_batch(app, {"user_prompts": prompts, "variants": 1})
+
+    by_index = {line["index"]: line for line in lines}
+    assert status == 200 and len(lines) == 4
+    assert by_index[0]["status"] == by_index[3]["status"] == "success"
+    assert by_index[1]["status"] == by_index[2]["status"] == "error"
+    assert "no images" in by_index[1]["detail"]
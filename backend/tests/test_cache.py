@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import fakeredis
+
+from app.cache import DesignCache, LocalCache
+
+DESIGN = {"ai_text": "a lion", "image_hash": "a" * 64}
+
+
+def test_local_tier_evicts_least_recently_used_by_entries():
+    local = LocalCache(max_entries=2, max_bytes=1 << 20)
+    local.set("a", DESIGN, 60)
+    local.set("b", DESIGN, 60)
+    local.get("a")  # Touch: "b" is now the least recently used
+    local.set("c", DESIGN, 60)
+
+    assert local.get("b") is None
+    assert local.get("a") == DESIGN and local.get("c") == DESIGN
+    assert local.stats["evictions"] == 1
+
+
+def test_local_tier_evicts_by_bytes_and_skips_oversized_values():
+    entry_size = len("k0") + sum(len(k) + len(str(v)) for k, v in DESIGN.items())
+    local = LocalCache(max_entries=100, max_bytes=3 * entry_size)
+    for n in range(5):
+        local.set(f"k{n}", DESIGN, 60)
+
+    assert len(local) == 3 and local.size_bytes <= 3 * entry_size
+    assert local.get("k0") is None and local.get("k4") == DESIGN
+
+    local.set("huge", {"ai_text": "x" * (4 * entry_size), "image_hash": "b" * 64}, 60)
+    assert local.get("huge") is None and len(local) == 3
+
+
+def test_given_local_tier_is_used_even_when_empty():
+    local = LocalCache(max_entries=0, max_bytes=0)  # Local tier disabled
+    assert DesignCache(None, local=local).local is local
+
+
+def test_local_copy_expires_with_the_redis_key():
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        cache = DesignCache(redis)
+        await redis.hset("design", mapping=DESIGN)
+        await redis.pexpire("design", 300)
+
+        assert await cache.get("design") == DESIGN  # Redis hit fills the local tier
+        expires_at = cache.local._entries["design"][0]
+        remaining = expires_at - time.monotonic()
+        await asyncio.sleep(0.4)
+        return remaining, cache.local.get("design"), await cache.get("design")
+
+    remaining, local_after, after = asyncio.run(scenario())
+
+    assert 0 < remaining <= 0.3  # Local TTL taken from PTTL, not the 24h default
+    assert local_after is None and after is None
+
+
+def test_overwrite_on_one_worker_drops_the_peers_local_copy():
+    async def wait_until(condition, timeout: float = 2.0):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "invalidation never arrived"
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        writer = DesignCache(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+        reader = DesignCache(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+        await writer.start()
+        await reader.start()
+
+        await writer.set("design", DESIGN)
+        await reader.get("design")
+        assert reader.local.get("design") == DESIGN
+
+        updated = {**DESIGN, "ai_text": "a roaring lion"}
+        await writer.set("design", updated)
+        await wait_until(lambda: "design" not in reader.local._entries)
+        seen_after_update = await reader.get("design")
+        own_copy = writer.local.get("design")  # Our own broadcast must not evict what we just wrote
+
+        await writer.invalidate("design")
+        await wait_until(lambda: "design" not in reader.local._entries)
+        seen_after_delete = await reader.get("design")
+
+        writer_local = writer.local.get("design")
+        await writer.stop()
+        await reader.stop()
+        return seen_after_update, own_copy, seen_after_delete, writer_local
+
+    seen_after_update, own_copy, seen_after_delete, writer_local = asyncio.run(scenario())
+
+    assert seen_after_update["ai_text"] == own_copy["ai_text"] == "a roaring lion"
+    assert seen_after_delete is None and writer_local is None
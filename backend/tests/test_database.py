@@ -0,0 +1,69 @@
+import asyncio
+import importlib.util
+import os
+
+from app import database
+
+
+def session_bind(module):
+    async def scenario():
+        sessions = module.get_db_replica()
+        session = await sessions.__anext__()
+        bind = session.bind
+        await sessions.aclose()
+        return bind
+
+    return asyncio.run(scenario())
+
+
+def load_database_copy(monkeypatch, **env):
+    # A private copy of app.database built under a different environment (sys.modules is left alone)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    spec = importlib.util.spec_from_file_location("database_copy", database.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_sqlite_gets_no_pool_or_driver_options():
+    options = database.engine_options("sqlite+aiosqlite:///local.sqlite")
+    assert options == {"echo": False, "pool_pre_ping": database.DB_POOL_PRE_PING}
+
+
+def test_asyncpg_caches_prepared_statements():
+    options = database.engine_options("postgresql+asyncpg://user@db/app")
+    assert options["pool_size"] == database.DB_POOL_SIZE
+    assert options["max_overflow"] == database.DB_MAX_OVERFLOW
+    assert options["pool_recycle"] == database.DB_POOL_RECYCLE_S
+    assert options["connect_args"] == {"prepared_statement_cache_size": database.DB_STATEMENT_CACHE_SIZE}
+
+
+def test_pgbouncer_disables_statement_caches_and_uses_unique_names(monkeypatch):
+    monkeypatch.setattr(database, "DB_PGBOUNCER", True)
+    connect_args = database.engine_options("postgresql+asyncpg://user@pgbouncer/app")["connect_args"]
+
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    name_func = connect_args["prepared_statement_name_func"]
+    assert name_func() != name_func()
+
+
+def test_other_drivers_get_pool_settings_only():
+    options = database.engine_options("mysql+aiomysql://user@db/app")
+    assert options["pool_size"] == database.DB_POOL_SIZE and "connect_args" not in options
+
+
+def test_replica_dependency_falls_back_to_the_primary(monkeypatch):
+    monkeypatch.delenv("DATABASE_REPLICA_URL", raising=False)
+    module = load_database_copy(monkeypatch)
+    assert module.replica_engine is module.engine
+    assert session_bind(module) is module.engine
+
+
+def test_replica_dependency_uses_the_replica_when_configured(monkeypatch, tmp_path):
+    replica_path = os.path.join(tmp_path, "replica.sqlite")
+    module = load_database_copy(monkeypatch, DATABASE_REPLICA_URL=f"sqlite+aiosqlite:///{replica_path}")
+    assert module.replica_engine is not module.engine
+    assert module.replica_engine.url.database == replica_path
+    assert session_bind(module) is module.replica_engine
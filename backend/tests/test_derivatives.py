@@ -0,0 +1,91 @@
+import asyncio
+import io
+import shutil
+
+import pytest
+from PIL import Image
+
+from app import derivatives
+from app.blob_store import LocalBlobStore
+from app.derivatives import DerivativeStore, VARIANTS, render_all
+
+
+def png_bytes(color=(200, 40, 40)) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (400, 400), color).save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_derivative_deleted_by_another_worker_is_rendered_again(tmp_path):
+    blob_store = LocalBlobStore(str(tmp_path / "blobs"))
+    store = DerivativeStore(blob_store, root=str(tmp_path / "derivatives"))
+
+    async def scenario():
+        image_hash = await blob_store.put(png_bytes())
+        first = await store.get(image_hash, 160, "webp")
+        # Simulates the janitor (or an operator) clearing the shared directory
+        shutil.rmtree(tmp_path / "derivatives")
+        second = await store.get(image_hash, 160, "webp")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first == second and second.is_file()
+    assert store.stats["encodes"] == 2
+
+
+def test_single_janitor_keeps_shared_directory_under_cap(tmp_path):
+    root = tmp_path / "derivatives"
+    workers = [DerivativeStore(None, root=str(root), max_bytes=10_000) for _ in range(3)]
+    locks = [worker._try_become_janitor() for worker in workers]
+    assert sum(lock is not None for lock in locks) == 1
+
+    for n in range(30):
+        path = root / f"hash{n}" / "160.webp"
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"x" * 1000)
+
+    janitor = workers[[lock is not None for lock in locks].index(True)]
+    janitor._evict()
+
+    assert sum(p.stat().st_size for p in root.glob("*/*")) <= 10_000
+    for lock in locks:
+        if lock is not None:
+            lock.close()
+
+
+def test_precompute_renders_every_standard_variant_from_one_pool_call(tmp_path, monkeypatch):
+    blob_store = LocalBlobStore(str(tmp_path / "blobs"))
+    store = DerivativeStore(blob_store, root=str(tmp_path / "derivatives"))
+    decodes = []
+    monkeypatch.setattr(derivatives, "render_all", lambda data, variants: decodes.append(variants) or render_all(data, variants))
+    data = png_bytes()
+    expected = [(width, fmt) for width in VARIANTS.values() for fmt in store.formats]
+
+    async def scenario():
+        image_hash = await blob_store.put(data)
+        store.precompute(image_hash, data)
+        # Asked for while the precompute is running: waits for it instead of encoding again
+        path = await store.get(image_hash, VARIANTS["thumb"], "webp")
+        return image_hash, path
+
+    image_hash, path = asyncio.run(scenario())
+
+    assert len(decodes) == 1 and sorted(decodes[0]) == sorted(expected)
+    assert store.stats["pool_calls"] == 1 and store.stats["pool_bytes_sent"] == len(data)
+    assert store.stats["encodes"] == len(expected)
+    assert path.is_file() and all(store.path(image_hash, width, fmt).is_file() for width, fmt in expected)
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    store = DerivativeStore(None, root=str(tmp_path / "derivatives"))
+    target = store.path("a" * 64, 160, "webp")
+
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(derivatives.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        store._write(target, b"encoded")
+
+    assert list(target.parent.iterdir()) == []
@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+import httpx
+
+from app.governor import AIMDLimiter
+
+CONCURRENT_PROMPTS = 50
+STUB_DELAY_S = 0.3
+
+
+def test_concurrent_distinct_prompts_take_about_one_call(app):
+    app.stub.delay = STUB_DELAY_S
+    # Measure the event loop, not the governor's starting concurrency limit
+    app.main.governor.limiter = AIMDLimiter(initial=CONCURRENT_PROMPTS, maximum=CONCURRENT_PROMPTS)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.post("/api/generate_tattoo", json={"user_prompt": f"distinct design {n}"})
+                for n in range(CONCURRENT_PROMPTS)
+            ))
+            return responses, time.perf_counter() - started
+
+    responses, wall = asyncio.run(scenario())
+
+    assert all(response.status_code == 200 for response in responses)
+    assert app.stub.calls == CONCURRENT_PROMPTS
+    # Serialized calls would take CONCURRENT_PROMPTS * STUB_DELAY_S (15s)
+    assert wall < 3 * STUB_DELAY_S
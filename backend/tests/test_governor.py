@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import httpx
+
+from app import governor as governor_module
+from app.governor import AIMDLimiter, UpstreamGovernor
+
+
+def test_coalesced_followers_are_not_charged_client_quota(app, monkeypatch):
+    # Production defaults: a burst of 5 per client
+    monkeypatch.setattr(governor_module, "CLIENT_BURST", 5)
+    monkeypatch.setattr(governor_module, "CLIENT_RATE_PER_S", 0.2)
+    app.stub.delay = 0.2
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/api/generate_tattoo", json={"user_prompt": "phoenix rising on back"})
+                for _ in range(20)
+            ))
+
+    responses = asyncio.run(scenario())
+
+    assert [r.status_code for r in responses] == [200] * 20
+    assert app.stub.calls == 1
+    assert app.main.governor.stats["rejected_client"] == 0
+
+
+def test_client_key_uses_trusted_forwarded_entry(monkeypatch):
+    headers = {"x-forwarded-for": "6.6.6.6, 203.0.113.7, 10.0.0.2"}
+    assert UpstreamGovernor.client_key(headers, "10.0.0.1") == "10.0.0.1"
+
+    monkeypatch.setattr(governor_module, "CLIENT_ID_HEADER", "x-forwarded-for")
+    monkeypatch.setattr(governor_module, "TRUSTED_PROXY_HOPS", 2)
+    # Two proxies appended the last two entries; the spoofable leftmost one is ignored
+    assert UpstreamGovernor.client_key(headers, "10.0.0.1") == "203.0.113.7"
+    assert UpstreamGovernor.client_key({}, "10.0.0.1") == "10.0.0.1"
+
+
+def test_one_congestion_episode_halves_the_limit_once():
+    async def scenario():
+        limiter = AIMDLimiter(initial=16, latency_target=1.0)
+        started = time.monotonic()
+        for _ in range(16):
+            assert await limiter.acquire(max_wait=1)
+        # Every call that was in flight comes back slow
+        for _ in range(16):
+            await limiter.release(latency=2.0, congested=False, started=started)
+        first = limiter.limit
+        # A call started after the decrease that is still slow is a new signal
+        assert await limiter.acquire(max_wait=1)
+        await limiter.release(latency=2.0, congested=False, started=time.monotonic())
+        return first, limiter.limit
+
+    first, second = asyncio.run(scenario())
+
+    assert first == 8
+    assert second == 4
@@ -0,0 +1,92 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+import httpx
+
+BASE_TIME = datetime(2024, 1, 1, 12, 0, 0)
+SQLITE_DATETIME = "%Y-%m-%d %H:%M:%S.%f"  # How SQLAlchemy stores DateTime in SQLite (cursor comparisons are textual)
+
+
+def insert_rows(db_path: str, rows: list):
+    # rows: (id, seconds after BASE_TIME, text); explicit ids model a sequence handing out ids before commit
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO conversations (id, timestamp, role, prompt_text) VALUES (?, ?, 'user', ?)",
+            [(row_id, (BASE_TIME + timedelta(seconds=offset)).strftime(SQLITE_DATETIME), text) for row_id, offset, text in rows],
+        )
+
+
+def get_history(app, **params):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/history", params=params)
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_cursor_pages_walk_back_through_every_row_once(app, db):
+    # Pairs of rows share a timestamp, so pages must tie-break on id
+    insert_rows(db, [(n, n // 2, f"message {n}") for n in range(1, 26)])
+
+    pages, cursor = [], None
+    while True:
+        page = get_history(app, limit=10, **({"before": cursor} if cursor else {}))
+        pages.append(page)
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+
+    ids = [message["id"] for page in reversed(pages) for message in page["messages"]]
+    assert ids == list(range(1, 26))
+    assert [len(page["messages"]) for page in pages] == [10, 10, 5]
+    assert pages[-1]["next_cursor"] is None
+
+
+def test_since_returns_new_rows_and_late_commits_inside_the_overlap(app, db):
+    insert_rows(db, [(1, 0, "first"), (2, 1, "second"), (10, 100, "latest seen")])
+    sync_cursor = get_history(app)["sync_cursor"]
+
+    insert_rows(db, [
+        (5, 99, "committed late by another worker"),  # Lower id/timestamp than what the client saw
+        (11, 101, "new"),
+        (3, 50, "late, but older than the overlap window"),
+    ])
+    page = get_history(app, since=sync_cursor)
+
+    texts = [message["text"] for message in page["messages"]]
+    assert texts == ["committed late by another worker", "latest seen", "new"]
+    assert not page["has_more"]
+
+    # Nothing new: only the overlap comes back and the cursor stays put
+    again = get_history(app, since=page["sync_cursor"])
+    assert again["sync_cursor"] == page["sync_cursor"]
+    assert "new" in [message["text"] for message in again["messages"]]
+
+
+def test_since_pages_forward_past_the_limit(app, db):
+    insert_rows(db, [(1, 0, "seen")])
+    sync_cursor = get_history(app)["sync_cursor"]
+    insert_rows(db, [(n, 1000 + n, f"new {n}") for n in range(2, 8)])
+
+    new_ids = []
+    while True:
+        page = get_history(app, since=sync_cursor, limit=2)
+        new_ids += [message["id"] for message in page["messages"]]
+        sync_cursor = page["sync_cursor"]
+        if not page["has_more"]:
+            break
+
+    assert sorted(set(new_ids)) == list(range(1, 8))
+
+
+def test_malformed_cursor_is_rejected(app, db):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/api/history", params={"since": "not-a-cursor"})
+
+    assert asyncio.run(scenario()).status_code == 400
@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+
+from app.blob_store import LocalBlobStore, content_hash
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 8
+
+
+def get_image(app, image_hash: str, headers: dict = None) -> httpx.Response:
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(f"/api/images/{image_hash}", headers=headers or {})
+
+    return asyncio.run(scenario())
+
+
+def test_identical_bytes_are_stored_once(tmp_path):
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+
+    first = asyncio.run(store.put(PNG))
+    written = store.path(first).stat()
+    second = asyncio.run(store.put(PNG))
+    other = asyncio.run(store.put(PNG + b"\x00"))
+
+    assert first == second == content_hash(PNG) and other != first
+    # The second put found the blob and skipped the write: same inode, no leftover temp files
+    assert store.path(first).stat().st_ino == written.st_ino
+    assert store.path(first).stat().st_mtime_ns == written.st_mtime_ns
+    assert sorted(p.name for p in (tmp_path / "blobs").rglob("*") if p.is_file()) == sorted([first, other])
+
+
+def test_image_is_served_with_etag_and_cache_headers(app):
+    image_hash = asyncio.run(app.main.blob_store.put(PNG))
+
+    response = get_image(app, image_hash)
+
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["etag"] == f'"{image_hash}"'
+    assert "immutable" in response.headers["cache-control"]
+
+
+def test_matching_if_none_match_returns_304(app):
+    image_hash = asyncio.run(app.main.blob_store.put(PNG))
+
+    response = get_image(app, image_hash, {"If-None-Match": f'"{"0" * 64}", "{image_hash}"'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == f'"{image_hash}"'
+    # A different ETag still gets the full image
+    assert get_image(app, image_hash, {"If-None-Match": f'"{"0" * 64}"'}).status_code == 200
+
+
+def test_range_request_returns_206_with_the_slice(app):
+    image_hash = asyncio.run(app.main.blob_store.put(PNG))
+
+    response = get_image(app, image_hash, {"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.content == PNG[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(PNG)}"
+
+
+def test_unknown_or_malformed_hash_returns_404(app):
+    unknown = content_hash(b"never stored")
+
+    assert get_image(app, unknown).status_code == 404
+    for malformed in ("abc", unknown.upper(), unknown[:-1] + "g", unknown + "0"):
+        assert get_image(app, malformed).status_code == 404, malformed
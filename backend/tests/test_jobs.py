@@ -0,0 +1,105 @@
+import asyncio
+
+import fakeredis
+
+from app import jobs
+from app.jobs import JobWorkerPool, RedisJobQueue, QUEUED, DONE
+
+
+async def wait_for_status(queue, job_id: str, status: str, timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        job = await queue.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job never reached {status}: {job}")
+
+
+def test_job_interrupted_by_shutdown_is_requeued_and_finished_later():
+    async def slow_handler(job, on_retry):
+        await asyncio.sleep(0.3)
+        return {"prompt": job["prompt"]}
+
+    async def scenario():
+        queue = RedisJobQueue(fakeredis.FakeAsyncRedis(decode_responses=True))
+        job, _ = await queue.enqueue("lion", 0, "dedup-lion")
+
+        pool = JobWorkerPool(handler=slow_handler, concurrency=1)
+        pool.start(queue)
+        await wait_for_status(queue, job["id"], "running")
+        await pool.stop()
+
+        interrupted = await queue.get(job["id"])
+        again, deduplicated = await queue.enqueue("lion", 0, "dedup-lion")
+
+        pool.start(queue)  # Next boot picks it up again
+        finished = await wait_for_status(queue, job["id"], DONE)
+        await pool.stop()
+        return interrupted, again, deduplicated, finished
+
+    interrupted, again, deduplicated, finished = asyncio.run(scenario())
+
+    assert interrupted["status"] == QUEUED
+    assert deduplicated and again["id"] == interrupted["id"]
+    assert finished["result"] == {"prompt": "lion"}
+
+
+def test_job_of_a_crashed_worker_is_recovered_after_its_lease(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_LEASE_S", 0.2)
+
+    async def scenario():
+        queue = RedisJobQueue(fakeredis.FakeAsyncRedis(decode_responses=True))
+        job, _ = await queue.enqueue("wolf", 0, "dedup-wolf")
+        # A worker claims the job and dies: no heartbeat, no finish
+        assert await queue.next_job(timeout=0) == job["id"]
+        job["status"] = "running"
+        await queue.update(job)
+
+        live_dedup = (await queue.enqueue("wolf", 0, "dedup-wolf"))[1]
+        await asyncio.sleep(0.3)
+        lapsed_job, lapsed_dedup = await queue.enqueue("wolf", 0, "dedup-wolf")
+        recovered = await queue.requeue_expired()
+        return job, live_dedup, lapsed_job, lapsed_dedup, recovered, await queue.get(job["id"])
+
+    job, live_dedup, lapsed_job, lapsed_dedup, recovered, old = asyncio.run(scenario())
+
+    assert live_dedup                                  # Lease still held: joins the running job
+    assert not lapsed_dedup and lapsed_job["id"] != job["id"]  # Lease lapsed: not joined
+    assert recovered == 1 and old["status"] == QUEUED
+
+
+def test_worker_survives_queue_errors_and_the_interrupted_job_is_recovered(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_LEASE_S", 0.2)
+
+    class FlakyQueue(RedisJobQueue):
+        failures = 1
+
+        async def update(self, job):
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("redis connection reset")
+            await super().update(job)
+
+    async def handler(job, on_retry):
+        return {"prompt": job["prompt"]}
+
+    async def scenario():
+        queue = FlakyQueue(fakeredis.FakeAsyncRedis(decode_responses=True))
+        first, _ = await queue.enqueue("lion", 0, "dedup-lion")
+
+        pool = JobWorkerPool(handler=handler, concurrency=1)
+        pool.start(queue)
+        while queue.failures:
+            await asyncio.sleep(0.01)
+        second, _ = await queue.enqueue("eagle", 0, "dedup-eagle")  # Queued after the failure
+
+        finished = [await wait_for_status(queue, job["id"], DONE) for job in (second, first)]
+        await pool.stop()
+        return finished
+
+    second, first = asyncio.run(scenario())
+
+    assert second["result"] == {"prompt": "eagle"}  # The only worker is still alive
+    assert first["result"] == {"prompt": "lion"}    # The interrupted job was reaped and rerun
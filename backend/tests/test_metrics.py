@@ -0,0 +1,102 @@
+import asyncio
+import re
+from collections import defaultdict
+
+import httpx
+
+from app.database import get_db_replica
+
+GENERATION_STAGES = ("prompt_engineering", "cache_lookup", "user_message_insert", "gemini_call", "image_store", "cache_write")
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="[^"\\]*",?)*\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="([^"]*)"')
+
+
+def parse_exposition(text: str) -> dict:
+    """
+    Checks Prometheus text format 0.0.4 line by line and returns
+    {metric family: [(sample name, labels dict, value)]}.
+    """
+    assert text.endswith("\n")
+    families, types = defaultdict(list), {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            current = line.split(" ")[2]
+            assert current not in types, f"{current} declared twice"
+            families[current] = []  # Declared families count even before their first sample
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, metric_type = line.split(" ")
+            assert name == current and metric_type in ("counter", "gauge", "histogram")
+            types[name] = metric_type
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"invalid sample line: {line!r}"
+        name, labels, value = match.group(1), dict(LABEL.findall(match.group(2) or "")), match.group(3)
+        float(value)  # Must be numeric (NaN/+Inf parse too)
+        family = re.sub(r"_(bucket|sum|count)$", "", name) if types.get(current) == "histogram" else name
+        assert family == current, f"sample {name} outside its family {current}"
+        families[family].append((name, labels, float(value)))
+    return families
+
+
+def histogram_series(samples: list, **labels) -> dict:
+    wanted = lambda sample_labels: all(sample_labels.get(k) == v for k, v in labels.items())
+    return {
+        "buckets": [(s[1]["le"], s[2]) for s in samples if s[0].endswith("_bucket") and wanted(s[1])],
+        "count": next(s[2] for s in samples if s[0].endswith("_count") and wanted(s[1])),
+    }
+
+
+def test_metrics_render_valid_exposition_for_every_generation_stage(app, db):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for _ in range(2):  # A miss (every stage), then a hit
+                response = await client.post("/api/generate_tattoo", json={"user_prompt": "metrics lion"})
+                assert response.status_code == 200
+            return await client.get("/metrics")
+
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    families = parse_exposition(response.text)
+    for stage in GENERATION_STAGES:
+        series = histogram_series(families["generation_stage_seconds"], stage=stage)
+        counts = [count for _, count in series["buckets"]]
+        assert counts == sorted(counts), f"{stage} buckets are not cumulative"
+        assert series["buckets"][-1] == ("+Inf", series["count"]) and series["count"] >= 1
+    lookups = {labels["result"]: value for _, labels, value in families["generation_cache_lookups_total"]}
+    assert lookups["hit"] >= 1 and lookups["miss"] >= 1
+    assert "event_loop_lag_seconds" in families and "write_behind_queue_depth" in families
+
+
+def test_timed_history_endpoint_keeps_query_validation_and_dependencies(app, db):
+    injected = []
+
+    async def recording_replica():
+        async for session in get_db_replica():
+            injected.append(session)
+            yield session
+
+    app.main.app.dependency_overrides[get_db_replica] = recording_replica
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            valid = await client.get("/api/history", params={"limit": 5})
+            sessions_for_valid = len(injected)
+            invalid = await client.get("/api/history", params={"limit": 0})
+            scraped = await client.get("/metrics")
+        return invalid, valid, sessions_for_valid, scraped
+
+    try:
+        invalid, valid, sessions_for_valid, scraped = asyncio.run(scenario())
+    finally:
+        app.main.app.dependency_overrides.clear()
+
+    assert invalid.status_code == 422               # Query(ge=1) still enforced through the decorator
+    assert valid.status_code == 200 and set(valid.json()) >= {"messages", "next_cursor", "has_more"}
+    assert sessions_for_valid == 1                  # Depends(get_db_replica) still resolved
+    history = histogram_series(parse_exposition(scraped.text)["history_request_seconds"])
+    assert history["count"] >= 1
@@ -0,0 +1,37 @@
+import pytest
+
+from app.prompt_normalizer import normalize_prompt
+from app.semantic_cache import SemanticIndex
+
+
+def index_of(*prompts: str) -> SemanticIndex:
+    index = SemanticIndex()
+    for prompt in prompts:
+        index.add(f"key:{prompt}", normalize_prompt(prompt))
+    return index
+
+
+@pytest.mark.parametrize("cached, query", [
+    ("color lion", "no color lion"),
+    ("koi fish sleeve", "koi fish half sleeve"),
+    ("snake and dagger", "dagger and snake"),
+    ("rose on wrist", "small rose on wrist"),
+])
+def test_different_designs_do_not_match(cached, query):
+    assert index_of(cached).nearest(normalize_prompt(query)) is None
+
+
+@pytest.mark.parametrize("cached, query", [
+    ("minimalist mountain range", "minimalist mountain ranges"),
+    ("Rose with thorns on my forearm", "rose thorns forearm"),
+])
+def test_near_duplicates_match(cached, query):
+    match = index_of(cached).nearest(normalize_prompt(query))
+    assert match is not None and match[0] == f"key:{cached}"
+
+
+def test_incompatible_best_match_falls_back_to_next_candidate():
+    # The negated prompt scores highest but must be skipped for the plural one
+    index = index_of("no geometric minimalist mountain range", "geometric minimalist mountain ranges")
+    match = index.nearest(normalize_prompt("geometric minimalist mountain range"))
+    assert match is not None and match[0] == "key:geometric minimalist mountain ranges"
@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+
+from app import singleflight
+from app.singleflight import SingleFlight, acquire_lock
+
+
+def test_concurrent_identical_prompts_make_one_upstream_call(app):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/api/generate_tattoo", json={"user_prompt": "a lion on the chest"})
+                for _ in range(100)
+            ))
+        return responses
+
+    responses = asyncio.run(scenario())
+
+    assert [r.status_code for r in responses] == [200] * 100
+    assert len({r.json()["image_url"] for r in responses}) == 1
+    assert app.stub.calls == 1
+
+
+async def run_workers(app, workers: int, callers_per_worker: int, prompt: str):
+    # Each SingleFlight stands in for one uvicorn worker; the Redis lock coalesces across them
+    main = app.main
+    engineered = main.engineer_prompt(prompt)
+    _, cache_key = main.cache_key_for(prompt)
+    flights = [SingleFlight() for _ in range(workers)]
+    return await asyncio.gather(*(
+        flight.do(cache_key, lambda: main.generate_design(prompt, engineered, cache_key))
+        for flight in flights
+        for _ in range(callers_per_worker)
+    ))
+
+
+def test_redis_lock_coalesces_across_workers(app, monkeypatch):
+    monkeypatch.setattr(app.main, "DISTRIBUTED_LOCK_ENABLED", True)
+
+    designs = asyncio.run(run_workers(app, workers=4, callers_per_worker=25, prompt="koi fish sleeve"))
+
+    assert len({d["image_hash"] for d in designs}) == 1
+    assert app.stub.calls == 1
+
+
+def test_lease_is_renewed_while_upstream_is_slow(app, monkeypatch):
+    # The upstream call outlives the lease several times over; waiters must keep waiting
+    monkeypatch.setattr(app.main, "DISTRIBUTED_LOCK_ENABLED", True)
+    monkeypatch.setattr(singleflight, "LOCK_LEASE_MS", 150)
+    app.stub.delay = 0.8
+
+    asyncio.run(run_workers(app, workers=3, callers_per_worker=5, prompt="rose and dagger"))
+
+    assert app.stub.calls == 1
+    assert app.main.generation_flight.stats["lock_takeovers"] == 0
+
+
+def test_expired_lease_is_taken_over_by_one_waiter(app, monkeypatch):
+    monkeypatch.setattr(app.main, "DISTRIBUTED_LOCK_ENABLED", True)
+    monkeypatch.setattr(singleflight, "LOCK_LEASE_MS", 150)
+    prompt = "wolf howling at the moon"
+    _, cache_key = app.main.cache_key_for(prompt)
+
+    async def scenario():
+        # A holder that died right after taking the lock: it never renews or releases
+        assert await acquire_lock(app.redis, cache_key) is not None
+        return await run_workers(app, workers=3, callers_per_worker=5, prompt=prompt)
+
+    designs = asyncio.run(scenario())
+
+    assert len({d["image_hash"] for d in designs}) == 1
+    assert app.stub.calls == 1
+    assert app.main.generation_flight.stats["lock_takeovers"] == 1
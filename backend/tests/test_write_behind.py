@@ -0,0 +1,105 @@
+import asyncio
+import sqlite3
+import time
+
+from app import write_behind
+from app.write_behind import ConversationWriter
+
+
+def stored_rows(db_path: str) -> list:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT id, timestamp, role, prompt_text FROM conversations ORDER BY id").fetchall()
+
+
+async def wait_for_written(writer: ConversationWriter, count: int, timeout: float = 5.0):
+    deadline = time.perf_counter() + timeout
+    while writer.stats["written"] < count:
+        assert time.perf_counter() < deadline, f"only {writer.stats['written']} of {count} rows written"
+        await asyncio.sleep(0.01)
+
+
+def test_full_batch_is_flushed_without_waiting_for_the_interval(db):
+    writer = ConversationWriter(batch_size=5, flush_interval_ms=60_000)
+
+    async def scenario():
+        writer.start()
+        for n in range(5):
+            await writer.submit("user", f"message {n}")
+        await wait_for_written(writer, 5)
+        flushes = writer.stats["flushes"]
+        await writer.stop()
+        return flushes
+
+    assert asyncio.run(scenario()) == 1
+    assert len(stored_rows(db)) == 5
+
+
+def test_partial_batch_is_flushed_after_the_interval(db):
+    writer = ConversationWriter(batch_size=100, flush_interval_ms=100)
+
+    async def scenario():
+        writer.start()
+        started = time.perf_counter()
+        for n in range(3):
+            await writer.submit("user", f"message {n}")
+        await wait_for_written(writer, 3)
+        elapsed = time.perf_counter() - started
+        await writer.stop()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+
+    assert 0.1 <= elapsed < 1.0
+    assert writer.stats["flushes"] == 1
+    assert len(stored_rows(db)) == 3
+
+
+def test_row_is_dropped_after_enqueue_timeout_on_a_full_queue(monkeypatch):
+    monkeypatch.setattr(write_behind, "ENQUEUE_TIMEOUT_S", 0.05)
+    writer = ConversationWriter(max_size=1)  # Never started: nothing drains the queue
+
+    async def scenario():
+        first = await writer.submit("user", "fits")
+        started = time.perf_counter()
+        second = await writer.submit("user", "does not fit")
+        return first, second, time.perf_counter() - started
+
+    first, second, waited = asyncio.run(scenario())
+
+    assert first is True and second is False
+    assert waited >= 0.05
+    assert writer.stats["enqueued"] == 1 and writer.stats["dropped"] == 1
+    assert writer.depth() == 1
+
+
+def test_stop_drains_rows_still_queued(db):
+    writer = ConversationWriter(batch_size=100, flush_interval_ms=60_000)
+
+    async def scenario():
+        writer.start()
+        for n in range(7):
+            await writer.submit("user", f"message {n}")
+        writer.submit_many([write_behind.conversation_row("model", "late reply")])
+        await writer.stop()
+
+    asyncio.run(scenario())
+
+    assert writer.stats["written"] == 8 and writer.depth() == 0
+    assert [row[3] for row in stored_rows(db)][-1] == "late reply"
+
+
+def test_rows_keep_submit_order_across_flushes(db):
+    writer = ConversationWriter(batch_size=3, flush_interval_ms=60_000)
+
+    async def scenario():
+        writer.start()
+        for n in range(10):
+            await writer.submit("user" if n % 2 == 0 else "model", f"message {n}")
+        await writer.stop()
+
+    asyncio.run(scenario())
+    rows = stored_rows(db)
+
+    assert writer.stats["flushes"] == 4  # 3 + 3 + 3, then the last row on stop()
+    assert [row[3] for row in rows] == [f"message {n}" for n in range(10)]
+    assert [row[1] for row in rows] == sorted(row[1] for row in rows)
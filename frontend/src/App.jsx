@@ -1,26 +1,55 @@
 // Save this as frontend/src/App.jsx
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef, useCallback } from 'react';
 import axios from 'axios';
 import './App.css';
 import ChatWindow from './components/ChatWindow';
 import PromptInput from './components/PromptInput';
-
-// Define the URL for your Python FastAPI backend
-const API_BASE_URL = 'http://127.0.0.1:8000';
+import { API_BASE_URL } from './config';
+
+// How often new messages (e.g. from another tab or device) are fetched incrementally
+const HISTORY_SYNC_INTERVAL_MS = 5000;
+
+// A local message (shown before the server has stored it) is the same message as a
+// server row with the same role and image (AI) or text (user)
+const isSameMessage = (local, row) =>
+  local.role === row.role && (row.role === 'ai' ? local.image_url === row.image_url : local.text === row.text);
+
+// Adds server rows to the history: rows already shown are skipped (incremental
+// fetches re-send a short overlap window), local copies are replaced in place
+const mergeServerMessages = (history, rows) => {
+  const knownIds = new Set(history.filter(message => !message.local).map(message => message.id));
+  let merged = history;
+  for (const row of rows) {
+    if (knownIds.has(row.id)) continue;
+    knownIds.add(row.id);
+    const localIndex = merged.findIndex(message => message.local && isSameMessage(message, row));
+    merged = localIndex === -1
+      ? [...merged, row]
+      : [...merged.slice(0, localIndex), row, ...merged.slice(localIndex + 1)];
+  }
+  return merged;
+};
 
 function App() {
   // --- STATE MANAGEMENT ---
   const [chatHistory, setChatHistory] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
+  // Cursor for the next (older) page of history; null when fully loaded
+  const [nextCursor, setNextCursor] = useState(null);
+  // Newest row the server has sent us; incremental fetches only ask for rows after it
+  const syncCursor = useRef(null);
 
   // --- 1. HISTORY LOADING (useEffect) ---
   // Fetches conversation history from the FastAPI database on component mount
   useEffect(() => {
     const fetchHistory = async () => {
       try {
+        // Only the most recent page is loaded on mount; older pages load on demand
         const response = await axios.get(`${API_BASE_URL}/api/history`);
-        const historyData = response.data;
+        const historyData = response.data.messages;
+        setNextCursor(response.data.next_cursor);
+        syncCursor.current = response.data.sync_cursor;
 
         // Add a welcome message if the database is truly empty
         if (historyData.length === 0) {
@@ -49,7 +78,46 @@ function App() {
     fetchHistory();
   }, []);
 
-  // --- 2. PROMPT SUBMISSION HANDLER ---
+  // --- 2. INCREMENTAL SYNC (Only Rows Newer Than The Sync Cursor) ---
+  const syncNewMessages = useCallback(async () => {
+    try {
+      let hasMore = true;
+      while (hasMore) {
+        const params = syncCursor.current ? { since: syncCursor.current } : {};
+        const response = await axios.get(`${API_BASE_URL}/api/history`, { params });
+        syncCursor.current = response.data.sync_cursor;
+        // Without a cursor (empty history) the newest page is all there is
+        hasMore = Boolean(params.since) && response.data.has_more;
+        const rows = response.data.messages;
+        if (rows.length > 0) {
+          setChatHistory(prev => mergeServerMessages(prev, rows));
+        }
+      }
+    } catch (error) {
+      console.error("Failed to sync chat history:", error);
+    }
+  }, []);
+
+  useEffect(() => {
+    const timer = setInterval(syncNewMessages, HISTORY_SYNC_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, [syncNewMessages]);
+
+  // --- 3. LOAD OLDER HISTORY (Keyset Pagination) ---
+  const loadOlderHistory = async () => {
+    if (!nextCursor) return;
+    try {
+      const response = await axios.get(`${API_BASE_URL}/api/history`, {
+        params: { before: nextCursor }
+      });
+      setChatHistory(prev => [...response.data.messages, ...prev]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error("Failed to fetch older chat history:", error);
+    }
+  };
+
+  // --- 4. PROMPT SUBMISSION HANDLER ---
   const handleSubmitPrompt = async (promptText) => {
     // 1. Validation and Setup
     if (!promptText.trim()) return;
@@ -59,7 +127,8 @@ function App() {
       id: Date.now() + 1, // Use timestamp for unique key
       role: 'user',
       text: promptText,
-      image_url: null
+      image_url: null,
+      local: true // Replaced by the stored row on the next sync
     };
     setChatHistory(prev => [...prev, newUserMessage]);
     setIsLoading(true);
@@ -78,6 +147,9 @@ function App() {
         role: 'ai',
         text: responseData.ai_text,
         image_url: responseData.image_url,
+        thumbnail_url: responseData.thumbnail_url,
+        preview_url: responseData.preview_url,
+        local: true
       };
 
       // 3. Update history with the final AI response (including image URL)
@@ -92,6 +164,7 @@ function App() {
         role: 'ai',
         text: "🚨 Error: Image generation failed. Check backend logs for API key or generation error.",
         image_url: null,
+        local: true
       };
       setChatHistory(prev => [...prev, errorMessage]);
 
@@ -106,7 +179,12 @@ function App() {
     <div className="app-container">
 
       {/* 1. Chat History Area - Now takes up most of the screen */}
-      <ChatWindow chatHistory={chatHistory} isLoading={isLoading} />
+      <ChatWindow
+        chatHistory={chatHistory}
+        isLoading={isLoading}
+        hasOlder={Boolean(nextCursor)}
+        onLoadOlder={loadOlderHistory}
+      />
 
       {/* 2. Bottom Section: Title + Input */}
       <header className="app-header">
@@ -3,13 +3,15 @@
 import React, { useRef, useEffect } from 'react';
 import MessageBubble from './MessageBubble';
 
-const ChatWindow = ({ chatHistory, isLoading }) => {
+const ChatWindow = ({ chatHistory, isLoading, hasOlder, onLoadOlder }) => {
     const messagesEndRef = useRef(null);
 
-    // Auto-scroll to the bottom when history updates
+    // Auto-scroll to the bottom only when a message is added at the end;
+    // loading earlier messages (prepended) keeps the reader where they are
+    const lastMessageId = chatHistory.length ? chatHistory[chatHistory.length - 1].id : null;
     useEffect(() => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
-    }, [chatHistory]);
+    }, [lastMessageId, isLoading]);
 
     const loadingBubble = {
         role: 'ai',
@@ -19,6 +21,13 @@ const ChatWindow = ({ chatHistory, isLoading }) => {
 
     return (
         <div className="chat-window">
+            {/* Older history is fetched page by page */}
+            {hasOlder && (
+                <button type="button" className="load-older-button" onClick={onLoadOlder}>
+                    Load earlier messages
+                </button>
+            )}
+
             {/* Map over the historical messages */}
             {chatHistory.map((message) => (
                 <MessageBubble key={message.id} message={message} />
@@ -1,6 +1,7 @@
 // Save this as frontend/src/components/MessageBubble.jsx
 
 import React from 'react';
+import { resolveImageUrl } from '../config';
 
 const MessageBubble = ({ message }) => {
     const isUser = message.role === 'user';
@@ -12,13 +13,21 @@ const MessageBubble = ({ message }) => {
                 <p style={{ margin: 0 }}>{message.text}</p>
 
                 {/* Conditional rendering for the image output */}
+                {/* The bubble shows the small preview variant; clicking opens the full image */}
                 {message.image_url && (
                     <div className="tattoo-image-container">
-                        <img
-                            src={message.image_url}
-                            alt="Generated Tattoo Design"
-                            className="tattoo-image"
-                        />
+                        <a href={resolveImageUrl(message.image_url)} target="_blank" rel="noreferrer">
+                            <img
+                                src={resolveImageUrl(message.preview_url || message.image_url)}
+                                srcSet={message.thumbnail_url
+                                    ? `${resolveImageUrl(message.thumbnail_url)} 160w, ${resolveImageUrl(message.preview_url)} 512w`
+                                    : undefined}
+                                sizes="(max-width: 600px) 160px, 512px"
+                                loading="lazy"
+                                alt="Generated Tattoo Design"
+                                className="tattoo-image"
+                            />
+                        </a>
                     </div>
                 )}
             </div>
@@ -0,0 +1,8 @@
+// Save this as frontend/src/config.js
+
+// Define the URL for your Python FastAPI backend
+export const API_BASE_URL = 'http://127.0.0.1:8000';
+
+// Backend image URLs are relative (/api/images/<hash>); older rows hold absolute URLs
+export const resolveImageUrl = (imageUrl) =>
+  imageUrl && imageUrl.startsWith('/') ? `${API_BASE_URL}${imageUrl}` : imageUrl;